@@ -0,0 +1,394 @@
+##############################################################################
+#
+# Copyright (c) 2010 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Benchmark harness for distribution resolution, downloads and scripts
+
+A synthetic package index is served by a local test server that can
+inject latency, bandwidth limits and errors, so that the resolver
+(zc.buildout.easy_install.install) and the download utility
+(zc.buildout.download.Download) can be measured reproducibly without
+network access.  The startup time of generated scripts, with and
+without import maps, can be measured against a synthetic set of eggs.
+Run it with::
+
+  python -m zc.buildout.benchmark --help
+"""
+
+import distutils.errors
+import logging
+import optparse
+import os
+import pkg_resources
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+import zc.buildout
+import zc.buildout.download
+import zc.buildout.easy_install
+import zc.buildout.testing
+from zc.buildout.rmtree import rmtree
+
+pyversion = sys.version[:3]
+
+def project_name(i):
+    return 'bench%d' % i
+
+def create_index(dest, projects=10, versions=3, requires=2):
+    """Create a synthetic package index in the dest directory.
+
+    The index has a page for each of the given number of projects,
+    each providing the given number of versions as (zip-safe) eggs.
+    Project i requires the projects i*requires+1 through
+    i*requires+requires, so resolving bench0 pulls in every project.
+
+    The name of the index directory, relative to dest, is returned.
+    """
+    index = os.path.join(dest, 'index')
+    os.mkdir(index)
+    for i in range(projects):
+        name = project_name(i)
+        deps = [project_name(d)
+                for d in range(i*requires+1, i*requires+requires+1)
+                if d < projects]
+        pdir = os.path.join(index, name)
+        os.mkdir(pdir)
+        for v in range(versions):
+            version = '1.%d' % v
+            egg = zipfile.ZipFile(
+                os.path.join(pdir, '%s-%s-py%s.egg'
+                             % (name, version, pyversion)),
+                'w')
+            egg.writestr('EGG-INFO/PKG-INFO',
+                         'Metadata-Version: 1.0\n'
+                         'Name: %s\n'
+                         'Version: %s\n'
+                         % (name, version))
+            egg.writestr('EGG-INFO/requires.txt', '\n'.join(deps)+'\n')
+            egg.writestr('EGG-INFO/top_level.txt', name+'\n')
+            egg.writestr('EGG-INFO/zip-safe', '\n')
+            egg.writestr(name+'.py', 'version = %r\n' % version)
+            egg.close()
+    return 'index'
+
+
+class Server(zc.buildout.testing.Server):
+    """Test server that injects latency, bandwidth limits and errors
+    """
+
+    def __init__(self, tree, server_address, latency=0, bandwidth=None,
+                 error_rate=0, seed=0):
+        zc.buildout.testing.Server.__init__(
+            self, tree, server_address, Handler)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.errors = 0
+
+    def fail(self):
+        if not self.error_rate:
+            return False
+        self.stats_lock.acquire()
+        try:
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                return True
+            return False
+        finally:
+            self.stats_lock.release()
+
+
+class Handler(zc.buildout.testing.Handler):
+
+    def do_GET(self):
+        server = self.server
+        if self.path.startswith('/__') or self.path.endswith('_logging'):
+            return zc.buildout.testing.Handler.do_GET(self)
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.fail():
+            self.count_request()
+            out = '<html><body>Injected error</body></html>'
+            self.send_response(500, 'Injected error')
+            self.send_header('Content-Length', str(len(out)))
+            self.send_header('Content-Type', 'text/html')
+            self.end_headers()
+            self.write(out)
+            return
+
+        zc.buildout.testing.Handler.do_GET(self)
+
+    def write(self, data):
+        bandwidth = self.server.bandwidth
+        if not bandwidth:
+            return zc.buildout.testing.Handler.write(self, data)
+        chunk = max(1, int(bandwidth) / 10)
+        for i in range(0, len(data), chunk):
+            piece = data[i:i+chunk]
+            zc.buildout.testing.Handler.write(self, piece)
+            time.sleep(float(len(piece)) / bandwidth)
+
+
+def start_server(tree, **kw):
+    """Start a benchmark server on the given tree.
+
+    Keyword arguments are passed to the Server constructor.  The
+    server URL and the server are returned.
+    """
+    port = zc.buildout.testing.get_port()
+    server = Server(tree, ('localhost', port), **kw)
+    thread = threading.Thread(target=server.serve_forever,
+                              name='benchmark-server')
+    thread.setDaemon(True)
+    thread.start()
+    zc.buildout.testing.wait(port, up=True)
+    server.thread = thread
+    return 'http://localhost:%s/' % port, server
+
+def stop_server(url, server):
+    zc.buildout.testing.stop_server(url, server.thread)
+
+def _counts(server, before=None):
+    result = dict(connections=server.connections, requests=server.requests,
+                  bytes=server.bytes)
+    if before is not None:
+        for name in result:
+            result[name] -= before[name]
+    return result
+
+def resolve(index_url, spec, dest, server=None):
+    """Install the distributions needed by spec into dest.
+
+    The index cache is cleared first, so every resolve starts cold.
+    Statistics are returned as a dictionary.
+    """
+    zc.buildout.easy_install.clear_index_cache()
+    if server is not None:
+        before = _counts(server)
+    start = time.time()
+    ws = zc.buildout.easy_install.install(
+        [spec], dest, index=index_url, newest=True)
+    result = dict(seconds=time.time()-start, distributions=len(list(ws)))
+    if server is not None:
+        result.update(_counts(server, before))
+    return result
+
+def download(urls, server=None):
+    """Download the given URLs with zc.buildout.download.Download.
+
+    Statistics are returned as a dictionary.
+    """
+    download = zc.buildout.download.Download(cache=None)
+    if server is not None:
+        before = _counts(server)
+    start = time.time()
+    size = failures = 0
+    for url in urls:
+        try:
+            path, is_temp = download(url)
+        except IOError:
+            failures += 1
+            continue
+        size += os.path.getsize(path)
+        if is_temp:
+            os.remove(path)
+    result = dict(seconds=time.time()-start, downloads=len(urls), size=size,
+                  failures=failures)
+    if server is not None:
+        result.update(_counts(server, before))
+    return result
+
+def run(projects=10, versions=3, requires=2, latency=0, bandwidth=None,
+        error_rate=0, repeat=3, seed=0):
+    """Run the resolve and download benchmarks.
+
+    Returns a list of (name, statistics) tuples, one for each resolve
+    and download run.
+    """
+    base = tempfile.mkdtemp('buildout-benchmark')
+    try:
+        index = create_index(base, projects, versions, requires)
+        url, server = start_server(base, latency=latency,
+                                   bandwidth=bandwidth,
+                                   error_rate=error_rate, seed=seed)
+        try:
+            results = []
+            for i in range(repeat):
+                dest = tempfile.mkdtemp('eggs', dir=base)
+                before = _counts(server)
+                start = time.time()
+                try:
+                    try:
+                        stats = resolve(
+                            url+index+'/', project_name(0), dest, server)
+                        stats['failures'] = 0
+                    except (zc.buildout.UserError,
+                            distutils.errors.DistutilsError):
+                        stats = dict(seconds=time.time()-start, failures=1)
+                        stats.update(_counts(server, before))
+                finally:
+                    rmtree(dest)
+                results.append(('resolve', stats))
+
+            urls = []
+            for i in range(projects):
+                name = project_name(i)
+                urls.append('%s%s/%s/%s-1.0-py%s.egg'
+                            % (url, index, name, name, pyversion))
+            for i in range(repeat):
+                results.append(('download', download(urls, server)))
+            return results
+        finally:
+            stop_server(url, server)
+    finally:
+        rmtree(base)
+
+def create_eggs(dest, eggs=100, imports=10):
+    """Create a synthetic set of develop-style eggs in the dest directory.
+
+    Each egg provides a module.  An additional egg, startmain, provides
+    a module with a main function, after importing the given number of
+    modules, spread evenly over the eggs.
+
+    A working set of the eggs, with startmain last, is returned.
+    """
+    names = [project_name(i) for i in range(eggs)]
+    step = max(1, eggs / max(1, imports))
+    imported = names[step-1::step][:imports]
+    working_set = pkg_resources.WorkingSet([])
+    for name, source in (
+        [(name, 'version = "1.0"\n') for name in names]
+        + [('startmain',
+            ''.join(['import %s\n' % name for name in imported])
+            + 'def main():\n    pass\n')]
+        ):
+        working_set.add(zc.buildout.testing.create_egg_dir(
+            dest, name, files={name+'.py': source}))
+    return working_set
+
+def startup(script, repeat=3):
+    """Run a script repeat times, returning statistics for each run
+    """
+    results = []
+    for i in range(repeat):
+        start = time.time()
+        p = subprocess.Popen([sys.executable, script])
+        p.wait()
+        results.append(dict(seconds=time.time()-start,
+                            failures=int(p.returncode != 0)))
+    return results
+
+def run_startup(eggs=100, imports=10, repeat=3):
+    """Run the script startup benchmark.
+
+    Returns a list of (name, statistics) tuples, one for each run of
+    the standard script and of the script with an import map.
+    """
+    base = tempfile.mkdtemp('buildout-benchmark')
+    try:
+        eggs_dir = os.path.join(base, 'eggs')
+        os.mkdir(eggs_dir)
+        working_set = create_eggs(eggs_dir, eggs, imports)
+        results = []
+        for name, import_map in (('startup', False),
+                                 ('startup-import-map', True)):
+            bin = os.path.join(base, name)
+            os.mkdir(bin)
+            zc.buildout.easy_install.scripts(
+                [('start', 'startmain', 'main')], working_set,
+                sys.executable, bin, import_map=import_map)
+            script = os.path.join(bin, 'start')
+            if sys.platform == 'win32':
+                script += '-script.py'
+            for stats in startup(script, repeat):
+                results.append((name, stats))
+        return results
+    finally:
+        rmtree(base)
+
+def report(results, out=None):
+    if out is None:
+        out = sys.stdout
+    for name in 'startup', 'startup-import-map':
+        runs = [stats for (n, stats) in results if n == name]
+        if not runs:
+            continue
+        seconds = [stats['seconds'] for stats in runs]
+        out.write('%s: %d runs, best %.3fs, mean %.3fs, %d failures\n'
+                  % (name, len(runs), min(seconds),
+                     sum(seconds)/len(seconds),
+                     sum([stats['failures'] for stats in runs])))
+    for name in 'resolve', 'download':
+        runs = [stats for (n, stats) in results if n == name]
+        if not runs:
+            continue
+        seconds = [stats['seconds'] for stats in runs]
+        requests = [stats.get('requests', 0) for stats in runs]
+        connections = [stats.get('connections', 0) for stats in runs]
+        failures = [stats.get('failures', 0) for stats in runs]
+        out.write('%s: %d runs, best %.3fs, mean %.3fs, '
+                  '%.1f requests and %.1f connections per run, '
+                  '%d failures\n'
+                  % (name, len(runs), min(seconds),
+                     sum(seconds)/len(seconds),
+                     float(sum(requests))/len(runs),
+                     float(sum(connections))/len(runs),
+                     sum(failures)))
+
+def main(args=None):
+    parser = optparse.OptionParser(
+        usage='%prog [options]',
+        description='Measure resolver and download throughput against a '
+        'synthetic local package index, or the startup time of '
+        'generated scripts.')
+    parser.add_option('-p', '--projects', type='int', default=10,
+                      help='Number of projects in the index.')
+    parser.add_option('-V', '--versions', type='int', default=3,
+                      help='Number of versions of each project.')
+    parser.add_option('-r', '--requires', type='int', default=2,
+                      help='Number of projects each project requires.')
+    parser.add_option('-l', '--latency', type='float', default=0,
+                      help='Per-request latency, in seconds.')
+    parser.add_option('-b', '--bandwidth', type='int', default=None,
+                      help='Bandwidth cap, in bytes per second.')
+    parser.add_option('-e', '--error-rate', type='float', default=0,
+                      help='Fraction of requests answered with an error.')
+    parser.add_option('-n', '--repeat', type='int', default=3,
+                      help='Number of runs of each benchmark.')
+    parser.add_option('-s', '--seed', type='int', default=0,
+                      help='Random seed used for error injection.')
+    parser.add_option('-S', '--startup-eggs', type='int', default=0,
+                      help='Measure the startup time of scripts using this '
+                      'number of eggs, instead of resolving and '
+                      'downloading.')
+    parser.add_option('-i', '--imports', type='int', default=10,
+                      help='Number of eggs imported by the startup script.')
+    options, args = parser.parse_args(args)
+    logging.basicConfig(level=logging.WARNING)
+    if options.startup_eggs:
+        report(run_startup(options.startup_eggs, options.imports,
+                           options.repeat))
+        return
+    report(run(options.projects, options.versions, options.requires,
+               options.latency, options.bandwidth, options.error_rate,
+               options.repeat, options.seed))
+
+if __name__ == '__main__':
+    main()
@@ -14,7 +14,7 @@
 """Buildout main script
 """
 
-from rmtree import rmtree
+from rmtree import rmtree, Trash
 try:
     from hashlib import md5
 except ImportError:
@@ -31,13 +31,16 @@ import os
 import pkg_resources
 import re
 import shutil
+import StringIO
 import subprocess
 import sys
 import tempfile
+import time
 import UserDict
 import zc.buildout
 import zc.buildout.download
 import zc.buildout.easy_install
+import zc.buildout.pool
 
 
 realpath = zc.buildout.easy_install.realpath
@@ -142,6 +145,8 @@ class Buildout(UserDict.DictMixin):
         __doing__ = 'Initializing.'
 
         self.__windows_restart = windows_restart
+        self._arguments = (config_file, cloptions, user_defaults,
+                           windows_restart, command)
 
         # default options
         data = dict(buildout=_buildout_default_options.copy())
@@ -168,6 +173,7 @@ class Buildout(UserDict.DictMixin):
                     'COMPUTED_VALUE')
         else:
             base = None
+        self._config_file = config_file
 
 
         cloptions = dict(
@@ -177,6 +183,7 @@ class Buildout(UserDict.DictMixin):
                                                   lambda v: v[0])
             )
         override = cloptions.get('buildout', {}).copy()
+        self._config_files = []
 
         # load user defaults, which override defaults
         if user_defaults:
@@ -184,12 +191,14 @@ class Buildout(UserDict.DictMixin):
                                        '.buildout', 'default.cfg')
             if os.path.exists(user_config):
                 _update(data, _open(os.path.dirname(user_config), user_config,
-                                    [], data['buildout'].copy(), override))
+                                    [], data['buildout'].copy(), override,
+                                    self._config_files))
 
         # load configuration files
         if config_file:
             _update(data, _open(os.path.dirname(config_file), config_file, [],
-                                data['buildout'].copy(), override))
+                                data['buildout'].copy(), override,
+                                self._config_files))
 
         # apply command-line options
         _update(data, cloptions)
@@ -198,6 +207,8 @@ class Buildout(UserDict.DictMixin):
         self._raw = _unannotate(data)
         self._data = {}
         self._parts = []
+        self._recipe_signatures = {}
+        self._loaded_entry_points = {}
         # provide some defaults before options are parsed
         # because while parsing options those attributes might be
         # used already (Gottfried Ganssauge)
@@ -225,6 +236,12 @@ class Buildout(UserDict.DictMixin):
         self._logger = logging.getLogger('zc.buildout')
         self.offline = False
         self.newest = True
+        self._installing = False
+        self._parts_to_install = []
+        self._trash = None
+        self._lazy_sections = (
+            buildout_section and
+            buildout_section.get('lazy-sections') == 'true')
 
         ##################################################################
         ## WARNING!!!
@@ -256,6 +273,40 @@ class Buildout(UserDict.DictMixin):
 
         self._setup_logging()
 
+        lazy_sections = options.get('lazy-sections', 'false')
+        if lazy_sections not in ('true', 'false'):
+            self._error('Invalid value for lazy-sections option: %s',
+                        lazy_sections)
+
+        verify_installed = options.get('verify-installed', 'full')
+        if verify_installed not in ('full', 'roots', 'none'):
+            self._error('Invalid value for verify-installed option: %s',
+                        verify_installed)
+        self._verify_installed = verify_installed
+
+        background_uninstall = options.get('background-uninstall', 'false')
+        if background_uninstall not in ('true', 'false'):
+            self._error('Invalid value for background-uninstall option: %s',
+                        background_uninstall)
+        self._background_uninstall = background_uninstall == 'true'
+
+        develop_skip_unchanged = options.get('develop-skip-unchanged',
+                                             'false')
+        if develop_skip_unchanged not in ('true', 'false'):
+            self._error(
+                'Invalid value for develop-skip-unchanged option: %s',
+                develop_skip_unchanged)
+        self._develop_skip_unchanged = develop_skip_unchanged == 'true'
+
+        develop_concurrency = options.get('develop-concurrency', '1')
+        try:
+            self._develop_concurrency = int(develop_concurrency)
+            if self._develop_concurrency < 1:
+                raise ValueError(develop_concurrency)
+        except ValueError:
+            self._error('Invalid value for develop-concurrency option: %s',
+                        develop_concurrency)
+
         offline = options.get('offline', 'false')
         if offline not in ('true', 'false'):
             self._error('Invalid value for offline option: %s', offline)
@@ -271,6 +322,31 @@ class Buildout(UserDict.DictMixin):
             options['newest'] = newest
         self.newest = newest == 'true'
 
+        upgrade_check_interval = options.get('upgrade-check-interval', '0')
+        try:
+            self._upgrade_check_interval = _parse_interval(
+                upgrade_check_interval)
+        except ValueError:
+            self._error('Invalid value for upgrade-check-interval option: %s',
+                        upgrade_check_interval)
+        watch_interval = options.get('watch-interval', '1')
+        try:
+            self._watch_interval = _parse_interval(watch_interval)
+            if self._watch_interval < 1:
+                raise ValueError(watch_interval)
+        except ValueError:
+            self._error('Invalid value for watch-interval option: %s',
+                        watch_interval)
+
+        # An explicit request for the newest distributions (-n) always
+        # checks for upgrades.
+        self._force_upgrade_check = (
+            override.get('newest', (None, None))[0] == 'true')
+        if self._force_upgrade_check:
+            # Don't reuse package-index pages read by earlier runs in
+            # the same process (see the serve command).
+            zc.buildout.easy_install.clear_index_cache()
+
         # This is a hacked version of zc.buildout for 1.4.4.
         # This means that buildout uses the defaults set up above.  The point
         # of it is to keep from migrating to 1.5 unless explicitly
@@ -317,6 +393,28 @@ class Buildout(UserDict.DictMixin):
 
             zc.buildout.easy_install.download_cache(download_cache)
 
+        build_cache = options.get('build-cache')
+        if build_cache:
+            build_cache = os.path.join(options['directory'], build_cache)
+            if not os.path.isdir(build_cache):
+                raise zc.buildout.UserError(
+                    'The specified build cache:\n'
+                    '%r\n'
+                    "Doesn't exist.\n"
+                    % build_cache)
+            zc.buildout.easy_install.build_cache(build_cache)
+
+        eggs_index = options.get('eggs-index-directory')
+        if eggs_index:
+            eggs_index = os.path.join(options['directory'], eggs_index)
+            if not os.path.isdir(eggs_index):
+                raise zc.buildout.UserError(
+                    'The specified eggs index directory:\n'
+                    '%r\n'
+                    "Doesn't exist.\n"
+                    % eggs_index)
+            zc.buildout.easy_install.eggs_index(eggs_index)
+
         install_from_cache = options.get('install-from-cache')
         if install_from_cache:
             if install_from_cache not in ('true', 'false'):
@@ -384,12 +482,24 @@ class Buildout(UserDict.DictMixin):
 
     init = bootstrap
 
-    def install(self, install_args):
+    def install(self, install_args, changed_only=False):
+        """Install the parts
+
+        If changed_only is true, parts that haven't changed are left
+        alone, rather than updated.
+        """
         __doing__ = 'Installing.'
 
         self._load_extensions()
         self._setup_directories()
 
+        # Directories of uninstalled parts can be moved to the trash
+        # and deleted in the background.  The trash may also have been
+        # left behind by an interrupted run.
+        trash = os.path.join(self['buildout']['directory'], '.trash')
+        if self._background_uninstall or os.path.isdir(trash):
+            self._trash = Trash(trash)
+
         # Add develop-eggs directory to path so that it gets searched
         # for eggs:
         sys.path.insert(0, self['buildout']['develop-eggs-directory'])
@@ -401,18 +511,37 @@ class Buildout(UserDict.DictMixin):
         (installed_part_options, installed_exists
          )= self._read_installed_part_options()
 
-        # Remove old develop eggs
-        self._uninstall(
-            installed_part_options['buildout'].get(
-                'installed_develop_eggs', '')
-            )
+        # Remove old develop eggs, except those that can be kept
+        # because their sources haven't changed
+        installed_develop_eggs = installed_part_options['buildout'].get(
+            'installed_develop_eggs', '')
+        unchanged = None
+        if self._develop_skip_unchanged:
+            unchanged = self._unchanged_develop_eggs(
+                installed_part_options['buildout'].get(
+                    'installed_develop_fingerprints', ''))
+            kept = {}
+            for fingerprint, files in unchanged.values():
+                kept.update(dict.fromkeys(files))
+            installed_develop_eggs = '\n'.join([
+                f for f in installed_develop_eggs.split('\n')
+                if f not in kept])
+        self._uninstall(installed_develop_eggs)
 
         # Build develop eggs
-        installed_develop_eggs = self._develop()
+        installed_develop_eggs = self._develop(unchanged)
         installed_part_options['buildout']['installed_develop_eggs'
                                            ] = installed_develop_eggs
 
-        if installed_exists:
+        if unchanged is not None:
+            fingerprints = _format_develop_fingerprints(unchanged)
+            installed_part_options['buildout'][
+                'installed_develop_fingerprints'] = fingerprints
+            if installed_exists:
+                self._update_installed(
+                    installed_develop_eggs=installed_develop_eggs,
+                    installed_develop_fingerprints=fingerprints)
+        elif installed_exists:
             self._update_installed(
                 installed_develop_eggs=installed_develop_eggs)
 
@@ -430,6 +559,7 @@ class Buildout(UserDict.DictMixin):
             uninstall_missing = True
 
         # load and initialize recipes
+        self._installing = True
         [self[part]['recipe'] for part in install_parts]
         if not install_args:
             install_parts = self._parts
@@ -449,21 +579,25 @@ class Buildout(UserDict.DictMixin):
 
         # uninstall parts that are no-longer used or who's configs
         # have changed
+        changes = False
         for part in reversed(installed_parts):
             if part in install_parts:
                 old_options = installed_part_options[part].copy()
                 installed_files = old_options.pop('__buildout_installed__')
+                old_digest = old_options.pop('__buildout_digest__', None)
                 new_options = self.get(part)
-                if old_options == new_options:
+                if old_digest is None:
+                    # installed by an older buildout
+                    same_options = old_options == new_options
+                else:
+                    same_options = old_digest == _options_digest(new_options)
+                if same_options:
                     # The options are the same, but are all of the
                     # installed files still there?  If not, we should
                     # reinstall.
                     if not installed_files:
                         continue
-                    for f in installed_files.split('\n'):
-                        if not os.path.exists(self._buildout_path(f)):
-                            break
-                    else:
+                    if self._installed_files_exist(installed_files):
                         continue
 
                 # output debugging info
@@ -487,6 +621,7 @@ class Buildout(UserDict.DictMixin):
 
             self._uninstall_part(part, installed_part_options)
             installed_parts = [p for p in installed_parts if p != part]
+            changes = True
 
             if installed_exists:
                 self._update_installed(parts=' '.join(installed_parts))
@@ -495,7 +630,16 @@ class Buildout(UserDict.DictMixin):
         _check_for_unused_options_in_section(self, 'buildout')
 
         # install new parts
+        self._parts_to_install = [
+            part for part in install_parts
+            if not (changed_only and part in installed_parts)]
         for part in install_parts:
+            if changed_only and part in installed_parts:
+                # Unchanged, but kept in installation order.
+                installed_parts.remove(part)
+                installed_parts.append(part)
+                continue
+            changes = True
             signature = self[part].pop('__buildout_signature__')
             saved_options = self[part].copy()
             recipe = self[part].recipe
@@ -559,9 +703,11 @@ class Buildout(UserDict.DictMixin):
                     installed_files = list(installed_files)
 
             installed_part_options[part] = saved_options
+            saved_options['__buildout_signature__'] = signature
+            saved_options['__buildout_digest__'] = _options_digest(
+                saved_options)
             saved_options['__buildout_installed__'
                           ] = '\n'.join(installed_files)
-            saved_options['__buildout_signature__'] = signature
 
             installed_parts = [p for p in installed_parts if p != part]
             installed_parts.append(part)
@@ -582,8 +728,38 @@ class Buildout(UserDict.DictMixin):
         elif (not installed_parts) and installed_exists:
             os.remove(self['buildout']['installed'])
 
+        if self._trash is not None:
+            self._trash.drain()
+
+        if changed_only and not changes:
+            self._logger.info("No parts have changed.")
+
         self._unload_extensions()
 
+    def _installed_files_exist(self, installed_files):
+        verify = self._verify_installed
+        if verify == 'none':
+            return True
+
+        paths = [self._buildout_path(f) for f in installed_files.split('\n')]
+        if verify == 'roots':
+            options = self['buildout']
+            paths = _installed_roots(
+                paths,
+                [options['directory']] +
+                [options[name+'-directory']
+                 for name in ('bin', 'parts', 'eggs', 'develop-eggs')],
+                options['directory'])
+
+        if len(paths) < _verify_threshold:
+            for path in paths:
+                if not os.path.exists(path):
+                    return False
+            return True
+
+        return False not in zc.buildout.pool.map(
+            os.path.exists, paths, _verify_jobs)
+
     def _update_installed(self, **buildout_options):
         installed = self['buildout']['installed']
         f = open(installed, 'a')
@@ -621,8 +797,13 @@ class Buildout(UserDict.DictMixin):
                 self._logger.info('Creating directory %r.', d)
                 os.mkdir(d)
 
-    def _develop(self):
+    def _develop(self, unchanged=None):
         """Install sources by running setup.py develop on them
+
+        If a dictionary of unchanged develop paths is passed, as
+        computed by _unchanged_develop_eggs, those paths aren't
+        developed again, and the fingerprints and egg links of the
+        paths that are developed are added to it.
         """
         __doing__ = 'Processing directories listed in the develop option'
 
@@ -635,6 +816,7 @@ class Buildout(UserDict.DictMixin):
 
         env = dict(os.environ, PYTHONPATH=pkg_resources_loc)
         here = os.getcwd()
+        parallel = []
         try:
             try:
                 for setup in develop.split():
@@ -646,9 +828,27 @@ class Buildout(UserDict.DictMixin):
                     else:
                         files.sort()
                     for setup in files:
+                        if unchanged is not None and setup in unchanged:
+                            self._logger.debug("Develop: %r is unchanged",
+                                               setup)
+                            continue
+                        if self._develop_concurrency > 1:
+                            if setup not in parallel:
+                                parallel.append(setup)
+                            continue
                         self._logger.info("Develop: %r", setup)
                         __doing__ = 'Processing develop directory %r.', setup
-                        zc.buildout.easy_install.develop(setup, dest)
+                        link = zc.buildout.easy_install.develop(setup, dest)
+                        if unchanged is not None:
+                            unchanged[setup] = (
+                                _develop_fingerprint(setup, [link]), [link])
+
+                if parallel:
+                    links = self._develop_parallel(parallel, dest)
+                    if unchanged is not None:
+                        for setup, link in zip(parallel, links):
+                            unchanged[setup] = (
+                                _develop_fingerprint(setup, [link]), [link])
             except:
                 # if we had an error, we need to roll back changes, by
                 # removing any files we created.
@@ -662,15 +862,82 @@ class Buildout(UserDict.DictMixin):
 
             else:
                 self._sanity_check_develop_eggs_files(dest, old_files)
-                return '\n'.join([os.path.join(dest, f)
-                                  for f in os.listdir(dest)
-                                  if f not in old_files
-                                  ])
+                installed = [os.path.join(dest, f)
+                             for f in os.listdir(dest)
+                             if f not in old_files
+                             ]
+                if unchanged:
+                    for fingerprint, links in unchanged.values():
+                        installed.extend([f for f in links
+                                          if f not in installed])
+                return '\n'.join(installed)
 
         finally:
             os.chdir(here)
 
 
+    def _develop_parallel(self, setups, dest):
+        """Develop several paths at once, in develop-concurrency processes
+
+        The output of each setup script is captured and shown, in
+        order, once all of them have finished.  The created egg links
+        are returned.
+        """
+        outputs = {}
+        def develop(setup):
+            __doing__ = 'Processing develop directory %r.', setup
+            output = tempfile.TemporaryFile()
+            try:
+                return zc.buildout.easy_install.develop(
+                    setup, dest, output=output)
+            finally:
+                output.seek(0)
+                outputs[setup] = output.read()
+                output.close()
+
+        for setup in setups:
+            self._logger.info("Develop: %r", setup)
+        try:
+            return zc.buildout.pool.map(develop, setups,
+                                        self._develop_concurrency)
+        finally:
+            for setup in setups:
+                output = outputs.get(setup)
+                if output:
+                    self._logger.info("Output of develop %r:", setup)
+                    sys.stdout.write(output)
+                    sys.stdout.flush()
+
+    def _unchanged_develop_eggs(self, fingerprints):
+        """Find the develop paths whose sources haven't changed
+
+        The fingerprints saved by a previous run are checked against
+        the develop paths that are still configured.  A dictionary
+        mapping each unchanged path to its fingerprint and egg links is
+        returned.
+        """
+        develop = self['buildout'].get('develop')
+        if not develop:
+            return {}
+        configured = {}
+        for setup in develop.split():
+            configured.update(dict.fromkeys(
+                glob.glob(self._buildout_path(setup))))
+
+        dest = self['buildout']['develop-eggs-directory']
+        result = {}
+        for line in fingerprints.split('\n'):
+            if not line.strip():
+                continue
+            fingerprint, links, setup = line.split(' ', 2)
+            links = [os.path.join(dest, f) for f in links.split(',') if f]
+            if (setup in configured and links
+                and [f for f in links if os.path.isfile(f)] == links
+                and _develop_fingerprint(setup, links) == fingerprint
+                ):
+                result[setup] = fingerprint, links
+        return result
+
     def _sanity_check_develop_eggs_files(self, dest, old_files):
         for f in os.listdir(dest):
             if f in old_files:
@@ -681,15 +948,21 @@ class Buildout(UserDict.DictMixin):
                     "Unexpected entry, %r, in develop-eggs directory.", f)
 
     def _compute_part_signatures(self, parts):
-        # Compute recipe signature and add to options
+        # Compute recipe signature and add to options.  Many parts
+        # usually share a recipe, so signatures are computed once per
+        # recipe requirement for the run.
+        signatures = self._recipe_signatures
         for part in parts:
             options = self.get(part)
             if options is None:
                 options = self[part] = {}
             recipe, entry = _recipe(options)
-            req = pkg_resources.Requirement.parse(recipe)
-            sig = _dists_sig(pkg_resources.working_set.resolve([req]))
-            options['__buildout_signature__'] = ' '.join(sig)
+            sig = signatures.get(recipe)
+            if sig is None:
+                req = pkg_resources.Requirement.parse(recipe)
+                sig = signatures[recipe] = ' '.join(
+                    _dists_sig(pkg_resources.working_set.resolve([req])))
+            options['__buildout_signature__'] = sig
 
     def _read_installed_part_options(self):
         old = self['buildout']['installed']
@@ -719,7 +992,10 @@ class Buildout(UserDict.DictMixin):
                 continue
             f = self._buildout_path(f)
             if os.path.isdir(f):
-                rmtree(f)
+                if self._background_uninstall and self._trash is not None:
+                    self._trash.delete(f)
+                else:
+                    rmtree(f)
             elif os.path.isfile(f):
                 try:
                     os.remove(f)
@@ -809,15 +1085,45 @@ class Buildout(UserDict.DictMixin):
         if not self.newest:
             return
 
-        ws = zc.buildout.easy_install.install(
-            [
+        specs = [
             (spec + ' ' + self['buildout'].get(spec+'-version', '')).strip()
             for spec in ('zc.buildout', 'setuptools')
-            ],
+            ]
+        links = self['buildout'].get('find-links', '').split()
+        index = self['buildout'].get('index')
+        path = [self['buildout']['develop-eggs-directory']]
+
+        # The result of the last check is recorded, along with what it
+        # depended on, so that it can be reused for the configured
+        # interval rather than querying the index on every run.
+        check_file = os.path.join(self['buildout']['directory'],
+                                  '.upgrade-check')
+        check_key = md5(repr((
+            specs, links, index, path, self._allow_hosts,
+            [pkg_resources.working_set.find(
+                pkg_resources.Requirement.parse(project)).location
+             for project in ('zc.buildout', 'setuptools')],
+            ))).hexdigest()
+        if self._upgrade_check_interval and not self._force_upgrade_check:
+            try:
+                age = time.time() - os.path.getmtime(check_file)
+                recorded = open(check_file).read().strip()
+            except (IOError, OSError):
+                pass
+            else:
+                if 0 <= age < self._upgrade_check_interval and (
+                    recorded == check_key):
+                    self._logger.debug(
+                        "Skipping upgrade check, last checked %d seconds ago.",
+                        age)
+                    return
+
+        ws = zc.buildout.easy_install.install(
+            specs,
             self['buildout']['eggs-directory'],
-            links = self['buildout'].get('find-links', '').split(),
-            index = self['buildout'].get('index'),
-            path = [self['buildout']['develop-eggs-directory']],
+            links = links,
+            index = index,
+            path = path,
             allow_hosts = self._allow_hosts
             )
 
@@ -829,6 +1135,15 @@ class Buildout(UserDict.DictMixin):
                 upgraded.append(ws.find(req))
 
         if not upgraded:
+            if self._upgrade_check_interval:
+                try:
+                    f = open(check_file, 'w')
+                    try:
+                        f.write(check_key+'\n')
+                    finally:
+                        f.close()
+                except (IOError, OSError):
+                    pass # it's only an optimization
             return
 
         __doing__ = 'Upgrading.'
@@ -847,6 +1162,12 @@ class Buildout(UserDict.DictMixin):
                               "buildout command.")
             return
 
+        from zc.buildout import serve
+        if serve.serving:
+            self._logger.warn("Not upgrading in a buildout server. "
+                              "Restart the server to upgrade.")
+            return
+
         if sys.platform == 'win32' and not self.__windows_restart:
             args = map(zc.buildout.easy_install._safe_arg, sys.argv)
             args.insert(1, '-W')
@@ -943,15 +1264,121 @@ class Buildout(UserDict.DictMixin):
 
     runsetup = setup # backward compat.
 
+    def serve(self, args):
+        __doing__ = 'Serving.'
+        config_file = self._config_file
+        if not config_file or _isurl(config_file):
+            raise zc.buildout.UserError(
+                "The serve command requires a local configuration file.")
+        from zc.buildout import serve
+        if args == ['stop']:
+            if not serve.stop(config_file):
+                self._logger.info("No buildout server is running.")
+            return
+        if args:
+            raise zc.buildout.UserError(
+                "The serve command accepts no arguments other than stop.")
+        serve.serve(config_file)
+
+    def watch(self, args):
+        __doing__ = 'Watching.'
+        if args == ['once']:
+            return self.install([], changed_only=True)
+        if args:
+            raise zc.buildout.UserError(
+                "The watch command accepts no arguments other than once.")
+
+        # Each pass runs in a new process, so that changed recipes and
+        # configuration are loaded afresh.
+        config_file, cloptions, user_defaults = self._arguments[:3]
+        command = [sys.executable]
+        if not __debug__:
+            command.append('-O')
+        command.append(sys.argv[0])
+        if config_file:
+            command.extend(['-c', config_file])
+        if not user_defaults:
+            command.append('-U')
+        command.extend(['%s:%s=%s' % option for option in cloptions])
+        command.extend(['watch', 'once'])
+
+        buildout = self
+        try:
+            while 1:
+                subprocess.call(command)
+                paths = buildout._watched_paths()
+                snapshot = _snapshot(paths)
+                self._logger.info("Watching for changes.")
+                while _snapshot(paths) == snapshot:
+                    time.sleep(self._watch_interval)
+
+                # Reread the configuration to see what to watch next.
+                root_logger = logging.getLogger()
+                handlers = root_logger.handlers[:], self._logger.handlers[:]
+                try:
+                    try:
+                        buildout = Buildout(*self._arguments)
+                    except (zc.buildout.UserError, ConfigParser.Error,
+                            IOError):
+                        pass # the next pass will report the error
+                finally:
+                    root_logger.handlers[:], self._logger.handlers[:] = (
+                        handlers)
+        except KeyboardInterrupt:
+            pass
+
+    def _watched_paths(self):
+        # Return the files and directories that, when changed, can
+        # change what needs to be installed, along with flags telling
+        # whether directories should be searched recursively.
+        paths = [(path, False) for path in self._config_files
+                 if not _isurl(path)]
+        for setup in self['buildout'].get('develop', '').split():
+            setup = self._buildout_path(setup)
+            if not os.path.isdir(setup):
+                setup = os.path.dirname(setup)
+            paths.append((setup, True))
+        # New eggs, including new recipe versions, show up here.
+        for name in 'eggs', 'develop-eggs':
+            paths.append((self['buildout'][name+'-directory'], False))
+        return paths
+
+    def parts_to_install(self):
+        """Return the names of the parts being installed or updated
+
+        The parts are in the order they're installed in.
+        """
+        return self._parts_to_install[:]
+
+    def references(self, section):
+        """Return the names of the sections referred to by a section
+
+        These are the sections named in the substitutions of the
+        section's options, as they were read.
+        """
+        result = []
+        for value in self._raw[section].values():
+            for token in _compile_template(value):
+                if isinstance(token, tuple) and token[0] is not None:
+                    name = token[0] or section
+                    if name not in result:
+                        result.append(name)
+        result.sort()
+        return result
+
     def annotate(self, args):
         _print_annotate(self._annotated)
 
     def __getitem__(self, section):
         __doing__ = 'Getting section %s.', section
         try:
-            return self._data[section]
+            options = self._data[section]
         except KeyError:
             pass
+        else:
+            if options._deferred and self._installing:
+                options._initialize()
+            return options
 
         try:
             data = self._raw[section]
@@ -978,6 +1405,13 @@ class Buildout(UserDict.DictMixin):
 
 def _install_and_load(spec, group, entry, buildout):
     __doing__ = 'Loading recipe %r.', spec
+    # Parts usually share recipes, so entry points are only looked up
+    # (and their requirements resolved) once per run.
+    key = spec, group, entry
+    loaded = buildout._loaded_entry_points.get(key)
+    if loaded is not None:
+        return loaded
+
     try:
         req = pkg_resources.Requirement.parse(spec)
 
@@ -1004,8 +1438,9 @@ def _install_and_load(spec, group, entry, buildout):
                 )
 
         __doing__ = 'Loading %s recipe entry %s:%s.', group, spec, entry
-        return pkg_resources.load_entry_point(
-            req.project_name, group, entry)
+        loaded = buildout._loaded_entry_points[key] = (
+            pkg_resources.load_entry_point(req.project_name, group, entry))
+        return loaded
 
     except Exception, v:
         buildout._logger.log(
@@ -1016,6 +1451,8 @@ def _install_and_load(spec, group, entry, buildout):
 
 class Options(UserDict.DictMixin):
 
+    _deferred = _lazy = False
+
     def __init__(self, buildout, section, data):
         self.buildout = buildout
         self.name = section
@@ -1030,6 +1467,17 @@ class Options(UserDict.DictMixin):
         if '<' in self._raw:
             self._raw = self._do_extend_raw(name, self._raw, [])
 
+        buildout = self.buildout
+        if buildout._lazy_sections:
+            # Substitutions are done as options are used.  Parts are
+            # initialized when they are accessed once installation
+            # has started.
+            self._lazy = True
+            self._deferred = name != 'buildout' and 'recipe' in self._raw
+            if not (self._deferred and buildout._installing):
+                return
+            self._deferred = False
+
         # force substitutions
         for k, v in self._raw.items():
             if '${' in v:
@@ -1043,7 +1491,6 @@ class Options(UserDict.DictMixin):
             return
 
         reqs, entry = _recipe(self._data)
-        buildout = self.buildout
         recipe_class = _install_and_load(reqs, 'zc.buildout', entry, buildout)
 
         __doing__ = 'Initializing part %s.', name
@@ -1079,9 +1526,8 @@ class Options(UserDict.DictMixin):
 
     def _dosub(self, option, v):
         __doing__ = 'Getting option %s:%s.', self.name, option
-        seen = [(self.name, option)]
-        v = '$$'.join([self._sub(s, seen) for s in v.split('$$')])
-        self._cooked[option] = v
+        seen = set([(self.name, option)])
+        self._cooked[option] = self._sub(v, seen)
 
     def get(self, option, default=None, seen=None):
         try:
@@ -1100,15 +1546,15 @@ class Options(UserDict.DictMixin):
         if '${' in v:
             key = self.name, option
             if seen is None:
-                seen = [key]
+                seen = set([key])
             elif key in seen:
                 raise zc.buildout.UserError(
                     "Circular reference in substitutions.\n"
                     )
             else:
-                seen.append(key)
-            v = '$$'.join([self._sub(s, seen) for s in v.split('$$')])
-            seen.pop()
+                seen.add(key)
+            v = self._sub(v, seen)
+            seen.discard(key)
 
         self._data[option] = v
         return v
@@ -1117,31 +1563,17 @@ class Options(UserDict.DictMixin):
     _simple = re.compile('[-a-zA-Z0-9 ._]+$').match
     _valid = re.compile('\${[-a-zA-Z0-9 ._]*:[-a-zA-Z0-9 ._]+}$').match
     def _sub(self, template, seen):
-        value = self._template_split(template)
         subs = []
-        for ref in value[1::2]:
-            s = tuple(ref[2:-1].split(':'))
-            if not self._valid(ref):
-                if len(s) < 2:
-                    raise zc.buildout.UserError("The substitution, %s,\n"
-                                                "doesn't contain a colon."
-                                                % ref)
-                if len(s) > 2:
-                    raise zc.buildout.UserError("The substitution, %s,\n"
-                                                "has too many colons."
-                                                % ref)
-                if not self._simple(s[0]):
-                    raise zc.buildout.UserError(
-                        "The section name in substitution, %s,\n"
-                        "has invalid characters."
-                        % ref)
-                if not self._simple(s[1]):
-                    raise zc.buildout.UserError(
-                        "The option name in substitution, %s,\n"
-                        "has invalid characters."
-                        % ref)
+        for token in _compile_template(template):
+            if not isinstance(token, tuple):
+                subs.append(token)
+                continue
 
-            section, option = s
+            section, option = token
+            if section is None:
+                # An invalid reference. The error message was computed
+                # when the template was compiled.
+                raise zc.buildout.UserError(option)
             if not section:
                 section = self.name
             v = self.buildout[section].get(option, None, seen)
@@ -1152,9 +1584,8 @@ class Options(UserDict.DictMixin):
                     raise MissingOption("Referenced option does not exist:",
                                         section, option)
             subs.append(v)
-        subs.append('')
 
-        return ''.join([''.join(v) for v in zip(value[::2], subs)])
+        return ''.join(subs)
 
     def __getitem__(self, key):
         try:
@@ -1189,6 +1620,11 @@ class Options(UserDict.DictMixin):
         return list(self._raw) + [k for k in self._data if k not in raw]
 
     def copy(self):
+        if self._lazy:
+            for k, v in self._raw.items():
+                if ('${' in v and k not in self._cooked
+                    and k not in self._data):
+                    self._dosub(k, v)
         result = self._raw.copy()
         result.update(self._cooked)
         result.update(self._data)
@@ -1223,6 +1659,57 @@ class Options(UserDict.DictMixin):
                 self.name)
         return self._created
 
+_compiled_templates = {}
+def _compile_template(template):
+    """Compile an option value into a sequence of tokens.
+
+    Tokens are literal strings, (section, option) references, or
+    (None, message) for invalid references.  Compiled templates are
+    cached, as the same values are substituted over and over.
+    """
+    try:
+        return _compiled_templates[template]
+    except KeyError:
+        pass
+
+    tokens = []
+    pieces = template.split('$$')
+    for i, piece in enumerate(pieces):
+        if i:
+            tokens.append('$$')
+        value = Options._template_split(piece)
+        for j, text in enumerate(value):
+            if not j % 2:
+                if text:
+                    tokens.append(text)
+                continue
+
+            ref = text
+            s = tuple(ref[2:-1].split(':'))
+            if not Options._valid(ref):
+                if len(s) < 2:
+                    tokens.append((None, "The substitution, %s,\n"
+                                   "doesn't contain a colon." % ref))
+                    continue
+                if len(s) > 2:
+                    tokens.append((None, "The substitution, %s,\n"
+                                   "has too many colons." % ref))
+                    continue
+                if not Options._simple(s[0]):
+                    tokens.append((None,
+                                   "The section name in substitution, %s,\n"
+                                   "has invalid characters." % ref))
+                    continue
+                if not Options._simple(s[1]):
+                    tokens.append((None,
+                                   "The option name in substitution, %s,\n"
+                                   "has invalid characters." % ref))
+                    continue
+            tokens.append(s)
+
+    tokens = _compiled_templates[template] = tuple(tokens)
+    return tokens
+
 _spacey_nl = re.compile('[ \t\r\f\v]*\n[ \t\r\f\v\n]*'
                         '|'
                         '^[ \t\r\f\v]+'
@@ -1267,10 +1754,15 @@ def _save_options(section, options, f):
     for option, value in items:
         _save_option(option, value, f)
 
-def _open(base, filename, seen, dl_options, override):
+# Parsed configuration files, by file name, along with a digest of
+# their contents, when they are being cached (by buildout serve).
+_parsed_configs = None
+
+def _open(base, filename, seen, dl_options, override, opened=None):
     """Open a configuration file and return the result as a dictionary,
 
-    Recursively open other files based on buildout options found.
+    Recursively open other files based on buildout options found.  The
+    names of the files are added to the opened list, if one is given.
     """
     _update_section(dl_options, override)
     _dl_options = _unannotate_section(dl_options.copy())
@@ -1304,19 +1796,37 @@ def _open(base, filename, seen, dl_options, override):
 
     root_config_file = not seen
     seen.append(filename)
+    if opened is not None:
+        opened.append(filename)
 
     result = {}
 
-    parser = ConfigParser.RawConfigParser()
-    parser.optionxform = lambda s: s
-    parser.readfp(fp)
-    if is_temp:
+    key = None
+    if _parsed_configs is not None and not is_temp and not _isurl(filename):
+        # The file's modification time and size can stay the same
+        # across edits, so it's the contents that are compared.
+        data = fp.read()
         fp.close()
-        os.remove(path)
+        fp = StringIO.StringIO(data)
+        key = md5(data).digest()
+    cached = _parsed_configs and _parsed_configs.get(filename)
+    if key is not None and cached and cached[0] == key:
+        sections = cached[1]
+    else:
+        parser = ConfigParser.RawConfigParser()
+        parser.optionxform = lambda s: s
+        parser.readfp(fp)
+        if is_temp:
+            fp.close()
+            os.remove(path)
+        sections = [(section, parser.items(section))
+                    for section in parser.sections()]
+        if key is not None:
+            _parsed_configs[filename] = key, sections
 
     extends = extended_by = None
-    for section in parser.sections():
-        options = dict(parser.items(section))
+    for section, items in sections:
+        options = dict(items)
         if section == 'buildout':
             extends = options.pop('extends', extends)
             extended_by = options.pop('extended-by', extended_by)
@@ -1329,9 +1839,11 @@ def _open(base, filename, seen, dl_options, override):
 
     if extends:
         extends = extends.split()
-        eresult = _open(base, extends.pop(0), seen, dl_options, override)
+        eresult = _open(base, extends.pop(0), seen, dl_options, override,
+                        opened)
         for fname in extends:
-            _update(eresult, _open(base, fname, seen, dl_options, override))
+            _update(eresult, _open(base, fname, seen, dl_options, override,
+                                   opened))
         result = _update(eresult, result)
 
     if extended_by:
@@ -1340,7 +1852,8 @@ def _open(base, filename, seen, dl_options, override):
             )
         for fname in extended_by.split():
             result = _update(result,
-                             _open(base, fname, seen, dl_options, override))
+                             _open(base, fname, seen, dl_options, override,
+                                   opened))
 
     seen.pop()
     return result
@@ -1366,6 +1879,148 @@ def _dir_hash(dir):
     _dir_hashes[dir] = dir_hash = hash.digest().encode('base64').strip()
     return dir_hash
 
+def _snapshot(paths):
+    # Return the modification times and sizes of the given paths and,
+    # for those marked as recursive, of the files in them.
+    result = {}
+    for path, recursive in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        result[path] = st.st_mtime, st.st_size
+        if not (recursive and os.path.isdir(path)):
+            continue
+        for (dirpath, dirnames, filenames) in os.walk(path):
+            dirnames[:] = [n for n in dirnames if n not in ignore_directories]
+            for name in dirnames + filenames:
+                if name.endswith('pyc') or name.endswith('pyo'):
+                    continue
+                name = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(name)
+                except OSError:
+                    continue
+                result[name] = st.st_mtime, st.st_size
+    return result
+
+# Installed files of unchanged parts are checked by a pool of threads
+# when there are at least _verify_threshold of them.
+_verify_threshold = 100
+_verify_jobs = 8
+
+def _installed_roots(paths, shared, directory):
+    """Reduce installed paths to the directories containing them
+
+    Paths inside other installed paths are dropped.  Paths that share a
+    parent directory are replaced by the directory, unless it is one
+    of the shared directories, repeatedly, so that a large tree of
+    installed files is checked with a few directory-level stats.
+    Only paths inside the buildout directory are replaced, and never
+    by the buildout directory itself, as other directories hold files
+    that aren't the buildout's.
+    """
+    directory = os.path.normpath(directory)
+    shared = dict.fromkeys([os.path.normpath(d) for d in shared])
+    shared[directory] = 1
+    inside = directory + os.path.sep
+    roots = dict.fromkeys([os.path.normpath(p) for p in paths if p])
+    while 1:
+        paths = roots
+        roots = []
+        for path in paths:
+            parent = os.path.dirname(path)
+            while parent not in shared and parent != os.path.dirname(parent):
+                if parent in paths:
+                    break
+                parent = os.path.dirname(parent)
+            else:
+                roots.append(path)
+
+        parents = {}
+        for path in roots:
+            parents.setdefault(os.path.dirname(path), []).append(path)
+        result = {}
+        for parent, children in parents.items():
+            if (len(children) > 1 and parent not in shared
+                and parent.startswith(inside)):
+                result[parent] = 1
+            else:
+                result.update(dict.fromkeys(children))
+        if len(result) == len(roots):
+            roots.sort()
+            return roots
+        roots = result
+
+_interval_units = dict(s=1, m=60, h=3600, d=86400, w=604800)
+def _parse_interval(value):
+    """Convert an interval, like 90, 30m, 12h or 1d, to seconds
+
+    A number without a unit is a number of seconds.  ValueError is
+    raised for invalid values.
+    """
+    value = value.strip().lower()
+    multiplier = 1
+    if value and value[-1] in _interval_units:
+        multiplier = _interval_units[value[-1]]
+        value = value[:-1].strip()
+    result = int(value) * multiplier
+    if result < 0:
+        raise ValueError(value)
+    return result
+
+def _options_digest(options):
+    """Compute a digest of a part's options
+
+    The digest is saved with the installed part, so that checking
+    whether the part's options have changed is a string comparison.
+    """
+    items = options.items()
+    items.sort()
+    hash = md5()
+    for item in items:
+        hash.update(repr(item))
+    return hash.digest().encode('base64').strip()
+
+def _develop_fingerprint(setup, links):
+    """Compute a fingerprint of the sources of a develop path
+
+    It covers setup.py and setup.cfg, and the egg links created for the
+    path, along with the egg-info directories they point to.
+    """
+    if os.path.isdir(setup):
+        directory = setup
+        setup = os.path.join(setup, 'setup.py')
+    else:
+        directory = os.path.dirname(setup)
+    paths = [setup, os.path.join(directory, 'setup.cfg')]
+    for link in links:
+        paths.append(link)
+        if not link.endswith('.egg-link'):
+            continue
+        location = open(link).readline().strip()
+        location = os.path.join(os.path.dirname(link), location)
+        for info in sorted(glob.glob(os.path.join(location, '*.egg-info'))):
+            paths.extend(sorted(glob.glob(os.path.join(info, '*'))))
+
+    hash = md5()
+    for path in paths:
+        if os.path.isfile(path):
+            hash.update(repr((path, open(path, 'rb').read())))
+        else:
+            hash.update(repr((path, None)))
+    return hash.digest().encode('base64').strip()
+
+def _format_develop_fingerprints(fingerprints):
+    items = fingerprints.items()
+    items.sort()
+    return '\n'.join([
+        '%s %s %s' % (fingerprint,
+                      ','.join([os.path.basename(f) for f in links]),
+                      setup)
+        for (setup, (fingerprint, links)) in items
+        ])
+
 def _dists_sig(dists):
     result = []
     for dist in dists:
@@ -1563,6 +2218,26 @@ Commands:
     sorted alphabetically, along with the origin of the value (file name or
     COMPUTED_VALUE, DEFAULT_VALUE, COMMAND_LINE_VALUE).
 
+  serve [stop]
+
+    Keep the buildout machinery loaded in a resident process that
+    listens on a .buildout-serve Unix socket next to the configuration
+    file.  While it runs, install commands for the configuration are
+    run by the server, reusing the modules, package-index pages, egg
+    directory scans and configuration files it has already loaded.
+    Stop the server with "buildout serve stop" or an interrupt.
+
+  watch [once]
+
+    Install the parts whose options or recipes have changed, then
+    watch the configuration files, develop directories and egg
+    directories and do it again whenever they change.  Unlike the
+    install command, this doesn't update the parts that haven't
+    changed, so they don't pick up new versions of the eggs they use.
+    The buildout watch-interval option sets how often, in seconds,
+    the files are checked.  With the once argument, the changed parts
+    are installed once, without watching.
+
 """
 def _help():
     print _usage
@@ -1571,6 +2246,7 @@ def _help():
 def main(args=None):
     if args is None:
         args = sys.argv[1:]
+    original_args = list(args)
 
     config_file = 'buildout.cfg'
     verbosity = 0
@@ -1651,12 +2327,21 @@ def main(args=None):
         command = args.pop(0)
         if command not in (
             'install', 'bootstrap', 'runsetup', 'setup', 'init',
-            'annotate',
+            'annotate', 'serve', 'watch',
             ):
             _error('invalid command:', command)
     else:
         command = 'install'
 
+    if (command == 'install' and not windows_restart
+        and not _isurl(config_file)):
+        # If a buildout server is running for this configuration, let
+        # it do the work.
+        from zc.buildout import serve
+        status = serve.forward(config_file, original_args)
+        if status is not None:
+            sys.exit(status)
+
     try:
         try:
             buildout = Buildout(config_file, options,
@@ -20,21 +20,34 @@ installed.
 
 import distutils.errors
 import glob
+import imp
 import logging
+import marshal
 import os
 import pkg_resources
 import py_compile
 import re
-import setuptools.archive_util
-import setuptools.command.setopt
 import setuptools.package_index
 import shutil
+import struct
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 import zc.buildout
+import zc.buildout.eggindex
+import zc.buildout.pool
+import zc.buildout.rmtree
+import zipfile
 import zipimport
 
+try:
+    from hashlib import md5
+except ImportError:
+    # Python 2.4 and older
+    from md5 import md5
+
 _oprp = getattr(os.path, 'realpath', lambda path: path)
 def realpath(path):
     return os.path.normcase(os.path.abspath(_oprp(path)))
@@ -74,6 +87,10 @@ class IncompatibleVersionError(zc.buildout.UserError):
 
 FILE_SCHEME = re.compile('file://', re.I).match
 
+# setuptools.archive_util and setuptools.command.setopt pull in the
+# archive libraries, so they are imported when first needed rather
+# than when buildout starts.
+
 class AllowHostsPackageIndex(setuptools.package_index.PackageIndex):
     """Will allow urls that are local to the system.
 
@@ -104,6 +121,37 @@ def _get_index(index_url, find_links, allow_hosts=('*',)):
 
 clear_index_cache = _indexes.clear
 
+_environments = {}
+def _environment(path, cache, eggs_index=None):
+    # Return an environment for the distributions in path.  If cache
+    # is true, the distributions found in each directory are reused
+    # until the directory's contents change.  If eggs_index is given,
+    # directories of eggs are read using their indexes, kept there.
+    if eggs_index:
+        env = pkg_resources.Environment([])
+        for item in path:
+            names = zc.buildout.eggindex.listdir(item)
+            if names is None:
+                env += _environment([item], cache)
+            else:
+                env += zc.buildout.eggindex.environment(
+                    eggs_index, item, names)
+        return env
+    if not cache:
+        return pkg_resources.Environment(path)
+    env = pkg_resources.Environment([])
+    for item in path:
+        try:
+            key = os.stat(item).st_mtime, sorted(os.listdir(item))
+        except OSError:
+            key = None
+        cached = _environments.get(item)
+        if cached is None or cached[0] != key:
+            cached = _environments[item] = key, pkg_resources.Environment(
+                [item])
+        env += cached[1]
+    return env
+
 if is_win32:
     # work around spawn lamosity on windows
     # XXX need safe quoting (see the subproces.list2cmdline) and test
@@ -120,15 +168,64 @@ def call_subprocess(args, **kw):
 
 _easy_install_cmd = 'from setuptools.command.easy_install import main; main()'
 
+# Run before the setup script of a build to compile extension sources
+# with a number of threads, as the compiler runs in subprocesses.
+_compile_jobs_source = '''\
+import distutils.ccompiler, sys, threading
+def _compile(self, sources, output_dir=None, macros=None,
+             include_dirs=None, debug=0, extra_preargs=None,
+             extra_postargs=None, depends=None):
+    macros, objects, extra_postargs, pp_opts, build = self._setup_compile(
+        output_dir, macros, include_dirs, sources, depends, extra_postargs)
+    cc_args = self._get_cc_args(pp_opts, debug, extra_preargs)
+    todo = [obj for obj in objects if obj in build]
+    todo.reverse()
+    errors = []
+    def work():
+        while not errors:
+            try:
+                obj = todo.pop()
+            except IndexError:
+                return
+            src, ext = build[obj]
+            try:
+                self._compile(obj, src, ext, cc_args, extra_postargs, pp_opts)
+            except:
+                errors.append(sys.exc_info())
+    threads = [threading.Thread(target=work)
+               for i in range(min(%(jobs)d, len(todo)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        t, v, tb = errors[0]
+        raise t, v, tb
+    return objects
+distutils.ccompiler.CCompiler.compile = _compile
+'''
+
+def _build_jobs(build_ext):
+    # Return the build_ext options without the number of compile
+    # jobs, which isn't a build_ext option, and the number of jobs.
+    build_ext = dict(build_ext)
+    jobs = build_ext.pop('build-jobs', None)
+    if jobs is None:
+        jobs = zc.buildout.pool.cpu_count()
+    return build_ext, int(jobs)
+
 class Installer:
 
     _versions = {}
     _download_cache = None
+    _build_cache = None
+    _eggs_index = None
     _install_from_cache = False
     _prefer_final = True
     _use_dependency_links = True
     _allow_picked_versions = True
     _always_unzip = False
+    _cache_environments = False
 
     def __init__(self,
                  dest=None,
@@ -169,7 +266,10 @@ class Installer:
         if self._dest is None:
             newest = False
         self._newest = newest
-        self._env = pkg_resources.Environment(path)
+        # When nothing can be installed, as in offline mode, eggs
+        # directories are read using their indexes.
+        self._env = _environment(path, self._cache_environments,
+                                 dest is None and self._eggs_index)
         self._index = _get_index(index, links, self._allow_hosts)
 
         if versions is not None:
@@ -269,13 +369,16 @@ class Installer:
         assert len(dists) == 1
         return dists[0]
 
-    def _call_easy_install(self, spec, ws, dest, dist):
+    def _call_easy_install(self, spec, ws, dest, dist, jobs=1, lock=None):
 
         tmp = tempfile.mkdtemp(dir=dest)
         try:
             path = setuptools_loc
 
-            args = [sys.executable, '-c', _easy_install_cmd, '-mUNxd', tmp]
+            cmd = _easy_install_cmd
+            if jobs > 1:
+                cmd = _compile_jobs_source % dict(jobs=jobs) + cmd
+            args = [sys.executable, '-c', cmd, '-mUNxd', tmp]
             if self._always_unzip:
                 args.append('-Z')
             level = logger.getEffectiveLevel()
@@ -292,9 +395,17 @@ class Installer:
 
             sys.stdout.flush() # We want any pending output first
 
-            exit_code = subprocess.call(
-                list(args),
-                env=dict(os.environ, PYTHONPATH=path))
+            # The lock, if any, is held by the caller, except while
+            # easy_install runs, so that other builds can run alongside.
+            if lock is not None:
+                lock.release()
+            try:
+                exit_code = subprocess.call(
+                    list(args),
+                    env=dict(os.environ, PYTHONPATH=path))
+            finally:
+                if lock is not None:
+                    lock.acquire()
 
             dists = []
             env = pkg_resources.Environment([tmp])
@@ -336,7 +447,7 @@ class Installer:
                 newloc = os.path.join(dest, os.path.basename(d.location))
                 if os.path.exists(newloc):
                     if os.path.isdir(newloc):
-                        shutil.rmtree(newloc)
+                        zc.buildout.rmtree.rmtree(newloc)
                     else:
                         os.remove(newloc)
                 os.rename(d.location, newloc)
@@ -480,6 +591,7 @@ class Installer:
                                 )
 
                         if should_unzip:
+                            import setuptools.archive_util
                             setuptools.archive_util.unpack_archive(
                                 dist.location, newloc)
                         else:
@@ -505,6 +617,10 @@ class Installer:
                     shutil.rmtree(tmp)
 
             self._env.scan([self._dest])
+            if self._eggs_index:
+                zc.buildout.eggindex.added(
+                    self._eggs_index, self._dest,
+                    [d.location for d in dists])
             dist = self._env.best_match(requirement, ws)
             logger.info("Got %s.", dist)
 
@@ -634,8 +750,18 @@ class Installer:
 
         return ws
 
-    def build(self, spec, build_ext):
+    def build(self, spec, build_ext, key_data=''):
+        # Builds may run in several threads at once.  Everything but
+        # running easy_install, such as resolving and fetching the
+        # source distribution, is done by one of them at a time.
+        _build_lock.acquire()
+        try:
+            return self._build(spec, build_ext, key_data)
+        finally:
+            _build_lock.release()
 
+    def _build(self, spec, build_ext, key_data):
+        build_ext, jobs = _build_jobs(build_ext)
         requirement = self._constrain(pkg_resources.Requirement.parse(spec))
 
         dist, avail = self._satisfied(requirement, 1)
@@ -657,8 +783,21 @@ class Installer:
         try:
             dist = self._fetch(avail, tmp, self._download_cache)
 
+            cached = None
+            if self._build_cache:
+                cached = os.path.join(
+                    self._build_cache,
+                    _build_key(dist.location, build_ext, key_data))
+                if os.path.isdir(cached):
+                    logger.info("Using cached build of %s.", dist)
+                    locations = _copy_build(cached, self._dest)
+                    for location in locations:
+                        redo_pyc(location)
+                    return locations
+
             build_tmp = tempfile.mkdtemp('build')
             try:
+                import setuptools.archive_util
                 setuptools.archive_util.unpack_archive(dist.location,
                                                        build_tmp)
                 if os.path.exists(os.path.join(build_tmp, 'setup.py')):
@@ -682,17 +821,21 @@ class Installer:
                 if not os.path.exists(setup_cfg):
                     f = open(setup_cfg, 'w')
                     f.close()
+                import setuptools.command.setopt
                 setuptools.command.setopt.edit_config(
                     setup_cfg, dict(build_ext=build_ext))
 
                 dists = self._call_easy_install(
                     base, pkg_resources.WorkingSet(),
-                    self._dest, dist)
+                    self._dest, dist, jobs, _build_lock)
 
                 for dist in dists:
                     redo_pyc(dist.location)
 
-                return [dist.location for dist in dists]
+                locations = [dist.location for dist in dists]
+                if cached is not None:
+                    _save_build(locations, cached)
+                return locations
             finally:
                 shutil.rmtree(build_tmp)
 
@@ -714,6 +857,22 @@ def download_cache(path=-1):
         Installer._download_cache = path
     return old
 
+def build_cache(path=-1):
+    old = Installer._build_cache
+    if path != -1:
+        if path:
+            path = realpath(path)
+        Installer._build_cache = path
+    return old
+
+def eggs_index(path=-1):
+    old = Installer._eggs_index
+    if path != -1:
+        if path:
+            path = realpath(path)
+        Installer._eggs_index = path
+    return old
+
 def install_from_cache(setting=None):
     old = Installer._install_from_cache
     if setting is not None:
@@ -744,6 +903,14 @@ def always_unzip(setting=None):
         Installer._always_unzip = bool(setting)
     return old
 
+def cache_environments(setting=None):
+    old = Installer._cache_environments
+    if setting is not None:
+        Installer._cache_environments = bool(setting)
+        if not setting:
+            _environments.clear()
+    return old
+
 def install(specs, dest,
             links=(), index=None,
             executable=sys.executable, always_unzip=None,
@@ -760,19 +927,71 @@ def install(specs, dest,
 def build(spec, dest, build_ext,
           links=(), index=None,
           executable=sys.executable,
-          path=None, newest=True, versions=None, allow_hosts=('*',)):
+          path=None, newest=True, versions=None, allow_hosts=('*',),
+          key_data=''):
     assert executable == sys.executable, (executable, sys.executable)
-    installer = Installer(dest, links, index, sys.executable,
-                          True, path, newest,
-                          versions, allow_hosts=allow_hosts)
-    return installer.build(spec, build_ext)
+    _build_lock.acquire()
+    try:
+        installer = Installer(dest, links, index, sys.executable,
+                              True, path, newest,
+                              versions, allow_hosts=allow_hosts)
+    finally:
+        _build_lock.release()
+    return installer.build(spec, build_ext, key_data)
+
+_build_lock = threading.Lock()
+
+def _build_key(sdist, build_ext, key_data):
+    # Builds are identical if made from the same source distribution,
+    # with the same build_ext options and other data, such as
+    # environment settings, by the same kind of Python.
+    hash = md5()
+    f = open(sdist, 'rb')
+    try:
+        hash.update(f.read())
+    finally:
+        f.close()
+    build_ext = build_ext.items()
+    build_ext.sort()
+    hash.update(repr((build_ext, key_data, sys.version, sys.maxunicode,
+                      pkg_resources.get_build_platform())))
+    return hash.hexdigest()
+
+def _copy_build(src, dest):
+    result = []
+    for name in os.listdir(src):
+        new = os.path.join(dest, name)
+        _rm(new)
+        if os.path.isdir(os.path.join(src, name)):
+            shutil.copytree(os.path.join(src, name), new)
+        else:
+            shutil.copy2(os.path.join(src, name), new)
+        result.append(new)
+    result.sort()
+    return result
+
+def _save_build(locations, cached):
+    # Copy the eggs to a temporary directory in the cache that is
+    # then renamed, so that partial builds are never seen.
+    tmp = tempfile.mkdtemp('.tmp', '', os.path.dirname(cached))
+    try:
+        for location in locations:
+            new = os.path.join(tmp, os.path.basename(location))
+            if os.path.isdir(location):
+                shutil.copytree(location, new)
+            else:
+                shutil.copy2(location, new)
+        os.rename(tmp, cached)
+    except (IOError, OSError):
+        # Another build got there first, or we can't write the cache.
+        _rm(tmp)
 
 
 
 def _rm(*paths):
     for path in paths:
         if os.path.isdir(path):
-            shutil.rmtree(path)
+            zc.buildout.rmtree.rmtree(path)
         elif os.path.exists(path):
             os.remove(path)
 
@@ -793,7 +1012,8 @@ def _copyeggs(src, dest, suffix, undo):
 
 def develop(setup, dest,
             build_ext=None,
-            executable=sys.executable):
+            executable=sys.executable,
+            output=None):
     assert executable == sys.executable, (executable, sys.executable)
     if os.path.isdir(setup):
         directory = setup
@@ -803,6 +1023,9 @@ def develop(setup, dest,
 
     undo = []
     try:
+        jobs = 1
+        if build_ext:
+            build_ext, jobs = _build_jobs(build_ext)
         if build_ext:
             setup_cfg = os.path.join(directory, 'setup.cfg')
             if os.path.exists(setup_cfg):
@@ -815,6 +1038,7 @@ def develop(setup, dest,
             else:
                 open(setup_cfg, 'w')
                 undo.append(lambda: os.remove(setup_cfg))
+            import setuptools.command.setopt
             setuptools.command.setopt.edit_config(
                 setup_cfg, dict(build_ext=build_ext))
 
@@ -822,6 +1046,8 @@ def develop(setup, dest,
         undo.append(lambda: os.remove(tsetup))
         undo.append(lambda: os.close(fd))
 
+        if jobs > 1:
+            os.write(fd, _compile_jobs_source % dict(jobs=jobs))
         os.write(fd, runsetup_template % dict(
             setuptools=setuptools_loc,
             setupdir=directory,
@@ -843,7 +1069,10 @@ def develop(setup, dest,
         if log_level < logging.DEBUG:
             logger.debug("in: %r\n%s", directory, ' '.join(args))
 
-        call_subprocess(args)
+        if output is None:
+            call_subprocess(args)
+        else:
+            call_subprocess(args, stdout=output, stderr=subprocess.STDOUT)
 
         return _copyeggs(tmp3, dest, '.egg-link', undo)
 
@@ -867,6 +1096,10 @@ def scripts(reqs, working_set, executable, dest=None,
             interpreter=None,
             initialization='',
             relative_paths=False,
+            import_map=False,
+            path_module=None,
+            bundle=None,
+            manifest=None,
             ):
     assert executable == sys.executable, (executable, sys.executable)
 
@@ -893,8 +1126,9 @@ def scripts(reqs, working_set, executable, dest=None,
         if isinstance(req, str):
             req = pkg_resources.Requirement.parse(req)
             dist = working_set.find(req)
-            for name in pkg_resources.get_entry_map(dist, 'console_scripts'):
-                entry_point = dist.get_entry_info('console_scripts', name)
+            entry_map = _console_scripts(dist)
+            for name in entry_map:
+                entry_point = entry_map[name]
                 entry_points.append(
                     (name, entry_point.module_name,
                      '.'.join(entry_point.attrs))
@@ -902,6 +1136,39 @@ def scripts(reqs, working_set, executable, dest=None,
         else:
             entry_points.append(req)
 
+    if manifest:
+        manifest = os.path.join(dest, manifest)
+    manifest = _Manifest(manifest)
+
+    if bundle:
+        bundle = realpath(os.path.join(dest, bundle))
+        # Develop eggs and extra paths are left alone.
+        excluded = [realpath(dist.location) for dist in working_set
+                    if dist.precedence == pkg_resources.DEVELOP_DIST]
+        excluded.extend(map(realpath, extra_paths))
+        bundled = _bundle(bundle, [p for p in path if p not in excluded])
+        if bundled:
+            path = [bundle] + [p for p in path if p not in bundled]
+            generated.append(bundle)
+        elif os.path.exists(bundle):
+            os.remove(bundle)
+
+    if path_module:
+        path_module = os.path.join(dest, path_module+'.py')
+        spath, rpsetup = _relative_path_and_setup(
+            path_module, path, relative_paths)
+        generated.extend(_path_module(spath, path_module, rpsetup))
+
+    modules = None
+    if import_map:
+        modules = _import_map(path)
+
+    # With relative paths, the rendering of the path and import map
+    # only depends on the directory containing a script, so it is
+    # computed once per directory.
+    rendered = {}
+
+    snames = []
     for name, module_name, attrs in entry_points:
         if scripts is not None:
             sname = scripts.get(name)
@@ -909,26 +1176,134 @@ def scripts(reqs, working_set, executable, dest=None,
                 continue
         else:
             sname = name
-
         sname = os.path.join(dest, sname)
-        spath, rpsetup = _relative_path_and_setup(sname, path, relative_paths)
-
-        generated.extend(
-            _script(module_name, attrs, spath, sname, arguments,
-                    initialization, rpsetup)
-            )
+        spath, rpsetup = _relative_path_and_setup(
+            sname, path, relative_paths, rendered)
+        smap = None
+        if modules is not None:
+            key = 'import_map', os.path.dirname(sname)
+            if key not in rendered:
+                rendered[key] = _import_map_source(
+                    sname, modules, relative_paths)
+            smap = dict(modules=rendered[key], npath=len(path))
+        snames.append((sname, module_name, attrs, spath, rpsetup, smap))
+
+    def script(item):
+        sname, module_name, attrs, spath, rpsetup, smap = item
+        written = []
+        return (_script(module_name, attrs, spath, sname, arguments,
+                        initialization, rpsetup, smap, path_module, manifest,
+                        written),
+                written)
+
+    # Scripts are rendered and written by a pool of threads.  They are
+    # made executable, and logged, afterwards, in order.
+    for sgenerated, written in zc.buildout.pool.map(
+        script, snames, _script_jobs):
+        generated.extend(sgenerated)
+        for wdest, wscript in written:
+            try:
+                os.chmod(wdest, 0755)
+            except (AttributeError, os.error):
+                pass
+            logger.info("Generated script %r.", wscript)
 
     if interpreter:
         sname = os.path.join(dest, interpreter)
-        spath, rpsetup = _relative_path_and_setup(sname, path, relative_paths)
-        generated.extend(_pyscript(spath, sname, rpsetup))
+        spath, rpsetup = _relative_path_and_setup(
+            sname, path, relative_paths, rendered)
+        generated.extend(
+            _pyscript(spath, sname, rpsetup, path_module, manifest))
+
+    if manifest.path is not None:
+        manifest.save()
+        generated.append(manifest.path)
 
     return generated
 
-def _relative_path_and_setup(sname, path, relative_paths):
+# Scripts are generated by up to _script_jobs threads.
+_script_jobs = 8
+
+_entry_maps = {}
+def _console_scripts(dist):
+    # Return the console script entry points of dist.  Entry points of
+    # installed eggs are cached by location, as their metadata doesn't
+    # change; those of develop eggs are read every time.
+    if dist.precedence == pkg_resources.DEVELOP_DIST:
+        return pkg_resources.get_entry_map(dist, 'console_scripts')
+    key = dist.location, dist.project_name
+    entry_map = _entry_maps.get(key)
+    if entry_map is None:
+        entry_map = _entry_maps[key] = pkg_resources.get_entry_map(
+            dist, 'console_scripts')
+    return entry_map
+
+class _Manifest:
+    """Digests of generated files
+
+    Files whose size and modification time haven't changed since they
+    were recorded are compared to new contents by digest, rather than
+    by reading them back.  If a path is given, the digests are loaded
+    from, and saved to, it.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.changed = False
+        if path is not None and os.path.exists(path):
+            try:
+                self.entries = marshal.loads(open(path, 'rb').read())
+            except (EOFError, ValueError, TypeError):
+                pass # Unreadable; we'll read the files instead.
+
+    def unchanged(self, filename, data, mode=''):
+        """Return whether a file exists and contains data
+        """
+        stat = _stat(filename)
+        if stat is None:
+            return False
+        digest = md5(data).hexdigest()
+        if self.entries.get(os.path.basename(filename)) == stat + (digest, ):
+            return True
+        if open(filename, 'r'+mode).read() != data:
+            return False
+        self._record(filename, stat, digest)
+        return True
+
+    def write(self, filename, data, mode=''):
+        open(filename, 'w'+mode).write(data)
+        self._record(filename, _stat(filename), md5(data).hexdigest())
+
+    def _record(self, filename, stat, digest):
+        self.entries[os.path.basename(filename)] = stat + (digest, )
+        self.changed = True
+
+    def save(self):
+        if self.changed or not os.path.exists(self.path):
+            open(self.path, 'wb').write(marshal.dumps(self.entries))
+            self.changed = False
+
+def _stat(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+def _relative_path_and_setup(sname, path, relative_paths, cache=None):
+    # If a cache dictionary is passed, results are reused for scripts
+    # in the same directory.
     if relative_paths:
         relative_paths = os.path.normcase(relative_paths)
         sname = os.path.normcase(os.path.abspath(sname))
+        if cache is not None:
+            key = os.path.dirname(sname)
+            result = cache.get(key)
+            if result is None:
+                result = cache[key] = _relative_path_and_setup(
+                    sname, path, relative_paths)
+            return result
         spath = ',\n  '.join(
             [_relativitize(os.path.normcase(path_item), sname, relative_paths)
              for path_item in path]
@@ -974,7 +1349,9 @@ def _relativitize(path, script, relative_paths):
     if (common == relative_paths or
         common.startswith(os.path.join(relative_paths, ''))
         ):
-        return "join(base, %r)" % _relative_path(common, path)
+        # base is relative_paths, even if the path and the script
+        # have more in common, like when they're in the same directory.
+        return "join(base, %r)" % _relative_path(relative_paths, path)
     else:
         return repr(path)
 
@@ -986,44 +1363,95 @@ join = os.path.join
 base = os.path.dirname(os.path.abspath(os.path.realpath(__file__)))
 """
 
-def _script(module_name, attrs, path, dest, arguments, initialization, rsetup):
+def _script(module_name, attrs, path, dest, arguments, initialization, rsetup,
+            import_map=None, path_module=None, manifest=None, written=None):
+    # If written is a list, the generated script and its name are
+    # added to it, for the caller to make executable and log, rather
+    # than being handled here.
+    if manifest is None:
+        manifest = _Manifest()
     generated = []
     script = dest
     if is_win32:
         dest += '-script.py'
 
-    contents = script_template % dict(
+    template = script_template
+    values = dict(
         python = _safe_arg(sys.executable),
-        path = path,
+        path_setup = _path_setup(path, rsetup, path_module),
         module_name = module_name,
         attrs = attrs,
         arguments = arguments,
         initialization = initialization,
-        relative_paths_setup = rsetup,
         )
-    changed = not (os.path.exists(dest) and open(dest).read() == contents)
+    if import_map is not None:
+        template = import_map_script_template
+        values.update(import_map)
+    contents = template % values
+    changed = not manifest.unchanged(dest, contents)
 
     if is_win32:
         # generate exe file and give the script a magic name:
         exe = script+'.exe'
         new_data = pkg_resources.resource_string('setuptools', 'cli.exe')
-        if not os.path.exists(exe) or (open(exe, 'rb').read() != new_data):
+        if not manifest.unchanged(exe, new_data, 'b'):
             # Only write it if it's different.
-            open(exe, 'wb').write(new_data)
+            manifest.write(exe, new_data, 'b')
         generated.append(exe)
 
     if changed:
-        open(dest, 'w').write(contents)
-        logger.info("Generated script %r.", script)
-
-        try:
-            os.chmod(dest, 0755)
-        except (AttributeError, os.error):
-            pass
+        manifest.write(dest, contents)
+        if written is not None:
+            written.append((dest, script))
+        else:
+            logger.info("Generated script %r.", script)
+            try:
+                os.chmod(dest, 0755)
+            except (AttributeError, os.error):
+                pass
 
     generated.append(dest)
     return generated
 
+def _path_setup(path, rsetup, path_module, sep=''):
+    # Return the code that sets up the path of a script, either
+    # directly or by loading a shared path module.
+    if path_module:
+        return rsetup + path_module_setup % dict(
+            name=os.path.basename(path_module)[:-3],
+            filename=os.path.basename(path_module))
+    return path_setup_template % dict(
+        relative_paths_setup=rsetup, path=path, sep=sep)
+
+path_setup_template = """%(relative_paths_setup)s
+import sys
+%(sep)ssys.path[0:0] = [
+  %(path)s,
+  ]"""
+
+path_module_setup = """
+import sys
+if %(name)r not in sys.modules:
+    import imp, os
+    imp.load_source(%(name)r, os.path.join(
+        os.path.dirname(os.path.abspath(os.path.realpath(__file__))),
+        %(filename)r))"""
+
+def _path_module(path, dest, rsetup):
+    # Write a module that adds path to sys.path, and its bytecode, so
+    # that scripts sharing it don't need to parse it.
+    contents = (path_setup_template
+                % dict(relative_paths_setup=rsetup, path=path, sep='')
+                ).lstrip() + '\n'
+    compiled = dest + 'c'
+    changed = not (os.path.exists(dest) and open(dest).read() == contents)
+    if changed:
+        open(dest, 'w').write(contents)
+        logger.info("Generated path module %r.", dest)
+    if changed or not os.path.exists(compiled):
+        py_compile.compile(dest, compiled, doraise=True)
+    return [dest, compiled]
+
 if is_jython and jython_os_name == 'linux':
     script_header = '#!/usr/bin/env %(python)s'
 else:
@@ -1032,11 +1460,261 @@ else:
 
 script_template = script_header + '''\
 
-%(relative_paths_setup)s
-import sys
-sys.path[0:0] = [
-  %(path)s,
-  ]
+%(path_setup)s
+%(initialization)s
+import %(module_name)s
+
+if __name__ == '__main__':
+    %(module_name)s.%(attrs)s(%(arguments)s)
+'''
+
+# The zip file entry recording the modification times of the locations
+# a bundle was made from, and the locations bundled.
+_bundle_manifest = 'BUNDLE-MANIFEST'
+
+def _bundle(dest, path):
+    """Write the modules and packages in path to a single zip file
+
+    Egg directories marked as zip safe, and zip files, in path are
+    added to the zip file, with compiled bytecode for their Python
+    source files.  Files found in more than one location are taken
+    from the first.  Locations containing extension modules, or marked
+    as not zip safe, are left out.  The zip file isn't rebuilt if none
+    of the locations in path have changed since it was written, and is
+    only rewritten if its contents change.
+
+    The locations added are returned.
+    """
+    stamps = []
+    for location in path:
+        try:
+            stamps.append((location, os.path.getmtime(location)))
+        except OSError:
+            stamps.append((location, None))
+    if os.path.exists(dest):
+        try:
+            zf = zipfile.ZipFile(dest)
+            try:
+                recorded, bundled = marshal.loads(zf.read(_bundle_manifest))
+            finally:
+                zf.close()
+        except (KeyError, IOError, zipfile.BadZipfile,
+                EOFError, ValueError, TypeError):
+            pass # Not made by us, or by an older version.
+        else:
+            if recorded == stamps:
+                return bundled
+
+    extensions = [suffix for (suffix, mode, kind) in imp.get_suffixes()
+                  if kind == imp.C_EXTENSION]
+    bundled = []
+    entries = {}
+    for location in path:
+        if os.path.isdir(location):
+            # Directories may use __file__ to find their data, so only
+            # ones known to be zip safe are bundled.
+            if not os.path.exists(
+                os.path.join(location, 'EGG-INFO', 'zip-safe')):
+                continue
+            files = []
+            for dirpath, dirnames, filenames in os.walk(location):
+                if dirpath == location and 'EGG-INFO' in dirnames:
+                    dirnames.remove('EGG-INFO')
+                for filename in filenames:
+                    files.append(os.path.join(dirpath, filename))
+            if [f for f in files for suffix in extensions
+                if f.endswith(suffix)]:
+                continue
+            bundled.append(location)
+            for f in files:
+                name = _relative_path(location, f).replace(os.path.sep, '/')
+                if name.endswith('.pyc') or name.endswith('.pyo'):
+                    continue
+                if name in entries:
+                    continue
+                date_time = time.localtime(os.path.getmtime(f))[:6]
+                # Zip files store times with a resolution of 2 seconds.
+                date_time = max(date_time[:5] + (date_time[5] & ~1, ),
+                                (1980, 1, 1, 0, 0, 0))
+                data = open(f, 'rb').read()
+                entries[name] = zipfile.ZipInfo(name, date_time), data
+                if name.endswith('.py') and name+'c' not in entries:
+                    try:
+                        code = compile(data.replace('\r\n', '\n') + '\n',
+                                       os.path.join(dest, name), 'exec')
+                    except SyntaxError:
+                        continue
+                    entries[name+'c'] = (
+                        zipfile.ZipInfo(name+'c', date_time),
+                        imp.get_magic()
+                        + struct.pack('<I', int(time.mktime(
+                            date_time + (0, 0, -1))))
+                        + marshal.dumps(code))
+        elif zipfile.is_zipfile(location):
+            zf = zipfile.ZipFile(location)
+            infos = zf.infolist()
+            if [info for info in infos
+                if info.filename == 'EGG-INFO/not-zip-safe'
+                or [suffix for suffix in extensions
+                    if info.filename.endswith(suffix)]]:
+                continue
+            bundled.append(location)
+            for info in infos:
+                if (info.filename.startswith('EGG-INFO/')
+                    or info.filename.endswith('/')
+                    or info.filename in entries):
+                    continue
+                entries[info.filename] = (
+                    zipfile.ZipInfo(info.filename, info.date_time),
+                    zf.read(info.filename))
+            zf.close()
+
+    if not bundled:
+        return bundled
+
+    entries[_bundle_manifest] = (
+        zipfile.ZipInfo(_bundle_manifest, (1980, 1, 1, 0, 0, 0)),
+        marshal.dumps((stamps, bundled)))
+    names = entries.keys()
+    names.sort()
+    tmp = dest + '.tmp'
+    zf = zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED)
+    for name in names:
+        info, data = entries[name]
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0644 << 16L
+        zf.writestr(info, data)
+    zf.close()
+    if (os.path.exists(dest)
+        and open(dest, 'rb').read() == open(tmp, 'rb').read()):
+        os.remove(tmp)
+    else:
+        if os.path.exists(dest):
+            os.remove(dest)
+        os.rename(tmp, dest)
+        logger.info("Generated bundle %r.", dest)
+    return bundled
+
+def _import_map(path):
+    """Map the top-level modules and packages in path to their locations
+
+    Names found in more than one location, like namespace packages,
+    are mapped to None.
+    """
+    suffixes = [suffix for (suffix, mode, kind) in imp.get_suffixes()]
+    result = {}
+    for location in path:
+        names = {}
+        if os.path.isdir(location):
+            for name in os.listdir(location):
+                if os.path.isdir(os.path.join(location, name)):
+                    for suffix in suffixes:
+                        if os.path.exists(
+                            os.path.join(location, name, '__init__'+suffix)):
+                            names[name] = 1
+                            break
+                else:
+                    for suffix in suffixes:
+                        if name.endswith(suffix):
+                            names[name[:-len(suffix)]] = 1
+        elif zipfile.is_zipfile(location):
+            for name in zipfile.ZipFile(location).namelist():
+                name = name.split('/')
+                if len(name) == 2 and name[1].startswith('__init__.'):
+                    names[name[0]] = 1
+                elif len(name) == 1:
+                    for suffix in suffixes:
+                        if name[0].endswith(suffix):
+                            names[name[0][:-len(suffix)]] = 1
+        for name in names:
+            if not _identifier(name):
+                continue
+            if name in result:
+                result[name] = None
+            else:
+                result[name] = location
+    return result
+
+_identifier = re.compile('[a-zA-Z_][a-zA-Z0-9_]*$').match
+
+def _import_map_source(sname, modules, relative_paths):
+    # Render an import map as a dictionary display, with paths
+    # relative to the script if requested.
+    names = modules.keys()
+    names.sort()
+    lines = []
+    for name in names:
+        location = modules[name]
+        if location is None:
+            value = 'None'
+        elif relative_paths:
+            value = _relativitize(
+                os.path.normcase(location),
+                os.path.normcase(os.path.abspath(sname)),
+                os.path.normcase(relative_paths))
+        else:
+            value = repr(location)
+        lines.append('%r: %s,' % (name, value))
+    return '\n  '.join(lines)
+
+# Scripts generated with an import map find the top-level modules and
+# packages of the eggs at the locations recorded when they were
+# generated, rather than by searching every egg on the path.  Other
+# modules are searched for in the rest of the path.  Anything not
+# found that way is left to the normal import machinery.
+import_map_script_template = script_header + '''\
+
+%(path_setup)s
+
+import imp
+
+class _ImportMap:
+
+    def __init__(self, modules, path):
+        self.modules = modules
+        self.path = path
+
+    def find_module(self, fullname, path=None):
+        if path is not None or imp.is_builtin(fullname):
+            return None
+        if fullname in self.modules:
+            location = self.modules[fullname]
+            if location is None:
+                return None
+            path = [location]
+        else:
+            location = None
+            path = self.path
+        try:
+            return _ImportMapLoader(imp.find_module(fullname, path))
+        except ImportError:
+            if location is not None:
+                try:
+                    import zipimport
+                    return zipimport.zipimporter(location).find_module(
+                        fullname)
+                except ImportError:
+                    pass
+            return None
+
+class _ImportMapLoader:
+
+    def __init__(self, found):
+        self.found = found
+
+    def load_module(self, fullname):
+        if fullname in sys.modules:
+            return sys.modules[fullname]
+        file, pathname, description = self.found
+        try:
+            return imp.load_module(fullname, file, pathname, description)
+        finally:
+            if file is not None:
+                file.close()
+
+sys.meta_path.insert(0, _ImportMap({
+  %(modules)s
+  }, sys.path[%(npath)s:]))
 %(initialization)s
 import %(module_name)s
 
@@ -1045,7 +1723,9 @@ if __name__ == '__main__':
 '''
 
 
-def _pyscript(path, dest, rsetup):
+def _pyscript(path, dest, rsetup, path_module=None, manifest=None):
+    if manifest is None:
+        manifest = _Manifest()
     generated = []
     script = dest
     if is_win32:
@@ -1053,21 +1733,20 @@ def _pyscript(path, dest, rsetup):
 
     contents = py_script_template % dict(
         python = _safe_arg(sys.executable),
-        path = path,
-        relative_paths_setup = rsetup,
+        path_setup = _path_setup(path, rsetup, path_module, '\n'),
         )
-    changed = not (os.path.exists(dest) and open(dest).read() == contents)
+    changed = not manifest.unchanged(dest, contents)
 
     if is_win32:
         # generate exe file and give the script a magic name:
         exe = script + '.exe'
-        open(exe, 'wb').write(
-            pkg_resources.resource_string('setuptools', 'cli.exe')
-            )
+        new_data = pkg_resources.resource_string('setuptools', 'cli.exe')
+        if not manifest.unchanged(exe, new_data, 'b'):
+            manifest.write(exe, new_data, 'b')
         generated.append(exe)
 
     if changed:
-        open(dest, 'w').write(contents)
+        manifest.write(dest, contents)
         try:
             os.chmod(dest,0755)
         except (AttributeError, os.error):
@@ -1079,12 +1758,7 @@ def _pyscript(path, dest, rsetup):
 
 py_script_template = script_header + '''\
 
-%(relative_paths_setup)s
-import sys
-
-sys.path[0:0] = [
-  %(path)s,
-  ]
+%(path_setup)s
 
 _interactive = True
 if len(sys.argv) > 1:
@@ -0,0 +1,226 @@
+##############################################################################
+#
+# Copyright (c) 2010 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""On-disk index of the eggs in an eggs directory
+
+Resolving requirements against the eggs already installed, as is done
+in offline mode, needs the project names, versions and requirements of
+the eggs.  Getting them from pkg_resources opens every egg.  An index
+records them, along with the other metadata read while resolving, so
+that only eggs added or changed since the index was written are read.
+
+Indexes are kept in a directory of their own, rather than in the eggs
+directories, with one file per eggs directory, named after a digest of
+the eggs directory's path.
+"""
+
+try:
+    from hashlib import md5
+except ImportError:
+    # Python 2.4 and older
+    from md5 import md5
+
+import marshal
+import os
+import pkg_resources
+import zipimport
+
+# Bump when the format of the entries changes.
+_format = 2
+
+# The metadata read when resolving requirements.
+_indexed = ('requires.txt', 'depends.txt', 'namespace_packages.txt',
+            'dependency_links.txt')
+
+def listdir(directory):
+    """Return the names in a directory whose distributions can be indexed
+
+    Only directories containing eggs, and no develop egg links or
+    egg-info directories, are indexed, as the metadata of those can
+    change without the directory changing.  None is returned for other
+    directories.
+    """
+    if directory.lower().endswith('.egg') or not os.path.isdir(directory):
+        return None
+    names = os.listdir(directory)
+    for name in names:
+        lower = name.lower()
+        if (lower.endswith('.egg-link') or lower.endswith('.egg-info')
+            or lower.endswith('.dist-info')):
+            return None
+    return names
+
+def index_path(index_directory, directory):
+    """Return the path of the index of an eggs directory
+    """
+    directory = os.path.normcase(os.path.realpath(directory))
+    return os.path.join(index_directory, md5(directory).hexdigest())
+
+def _stamp(location):
+    # The modification times that change when the indexed metadata of
+    # an egg does.  Changing a file in an unzipped egg's EGG-INFO
+    # doesn't change the modification time of the egg directory.
+    if not os.path.isdir(location):
+        return os.path.getmtime(location)
+    egg_info = os.path.join(location, 'EGG-INFO')
+    stamp = [os.path.getmtime(egg_info)]
+    for name in _indexed:
+        try:
+            stamp.append(os.path.getmtime(os.path.join(egg_info, name)))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+def _metadata(location):
+    if os.path.isdir(location):
+        return pkg_resources.PathMetadata(
+            location, os.path.join(location, 'EGG-INFO'))
+    return pkg_resources.EggMetadata(zipimport.zipimporter(location))
+
+
+class _IndexedMetadata:
+    """Metadata provider answering from the index
+
+    Metadata that isn't in the index is read from the egg, when it is
+    first asked for.
+    """
+
+    def __init__(self, location, metadata):
+        self.location = location
+        self.metadata = metadata
+        self.provider = None
+
+    def _provider(self):
+        if self.provider is None:
+            self.provider = _metadata(self.location)
+        return self.provider
+
+    def has_metadata(self, name):
+        if name in self.metadata:
+            return self.metadata[name] is not None
+        return self._provider().has_metadata(name)
+
+    def get_metadata(self, name):
+        if name in self.metadata:
+            if self.metadata[name] is None:
+                raise IOError("No %s in %s" % (name, self.location))
+            return self.metadata[name]
+        return self._provider().get_metadata(name)
+
+    def get_metadata_lines(self, name):
+        return pkg_resources.yield_lines(self.get_metadata(name))
+
+    def __getattr__(self, name):
+        return getattr(self._provider(), name)
+
+
+class Index:
+
+    def __init__(self, index_directory, directory):
+        self.directory = directory
+        self.path = index_path(index_directory, directory)
+        self.entries = {}
+        self.changed = False
+        try:
+            format, entries = marshal.loads(open(self.path, 'rb').read())
+        except (IOError, EOFError, ValueError, TypeError):
+            return # No usable index; it will be rebuilt.
+        if format == _format:
+            self.entries = entries
+
+    def _read(self, name):
+        location = os.path.join(self.directory, name)
+        metadata = _metadata(location)
+        recorded = {}
+        for mname in _indexed:
+            if metadata.has_metadata(mname):
+                recorded[mname] = metadata.get_metadata(mname)
+            else:
+                recorded[mname] = None
+        self.entries[name] = _stamp(location), recorded
+        self.changed = True
+
+    def refresh(self, names):
+        """Bring the index up to date with the names in the directory
+
+        Eggs added, or changed, since the index was written are read.
+        """
+        names = [name for name in names if name.lower().endswith('.egg')]
+        for name in self.entries.keys():
+            if name not in names:
+                del self.entries[name]
+                self.changed = True
+        for name in names:
+            entry = self.entries.get(name)
+            try:
+                if (entry is None or entry[0] !=
+                    _stamp(os.path.join(self.directory, name))):
+                    self._read(name)
+            except (IOError, OSError, zipimport.ZipImportError):
+                # Not an egg we can read, so not one we can use.
+                self.entries.pop(name, None)
+
+    def add(self, location):
+        """Record an egg that was just added to the directory
+        """
+        name = os.path.basename(location)
+        try:
+            self._read(name)
+        except (IOError, OSError, zipimport.ZipImportError):
+            self.entries.pop(name, None)
+
+    def environment(self):
+        """Return an environment for the eggs in the index
+        """
+        env = pkg_resources.Environment([])
+        for name, (mtime, metadata) in self.entries.items():
+            location = os.path.join(self.directory, name)
+            env.add(pkg_resources.Distribution.from_filename(
+                location, metadata=_IndexedMetadata(location, metadata)))
+        return env
+
+    def save(self):
+        if not self.changed:
+            return
+        tmp = self.path + '.tmp'
+        try:
+            open(tmp, 'wb').write(marshal.dumps((_format, self.entries)))
+            if os.path.exists(self.path):
+                os.remove(self.path) # for Windows
+            os.rename(tmp, self.path)
+        except (IOError, OSError):
+            pass # The index directory isn't writable; we'll read the eggs.
+        self.changed = False
+
+def environment(index_directory, directory, names):
+    """Return an environment for the eggs in directory, using its index
+
+    names are the names in the directory, as returned by listdir.
+    """
+    index = Index(index_directory, directory)
+    index.refresh(names)
+    index.save()
+    return index.environment()
+
+def added(index_directory, directory, locations):
+    """Record eggs added to directory, if it has an index
+    """
+    if not os.path.exists(index_path(index_directory, directory)):
+        return
+    index = Index(index_directory, directory)
+    directory = os.path.normcase(os.path.abspath(directory))
+    for location in locations:
+        if os.path.normcase(os.path.dirname(os.path.abspath(location))
+                            ) == directory:
+            index.add(location)
+    index.save()
@@ -0,0 +1,76 @@
+##############################################################################
+#
+# Copyright (c) 2010 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Apply functions to sequences of items using a pool of threads
+
+This is used for work that spends most of its time waiting on the file
+system or on subprocesses, where threads run concurrently despite the
+global interpreter lock.
+"""
+
+import sys
+import threading
+
+def cpu_count():
+    """Return the number of CPUs, or 1 if it can't be determined
+    """
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+
+def map(func, items, jobs):
+    """Call func with each of the items, using up to jobs threads.
+
+    A list of the results, in the order of the items, is returned.  If
+    any of the calls raise an exception, the exception raised for the
+    earliest item is re-raised, after all of the calls have finished.
+    """
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    results = [None] * len(items)
+    errors = {}
+    todo = iter(range(len(items)))
+    lock = threading.Lock()
+
+    def work():
+        while 1:
+            lock.acquire()
+            try:
+                try:
+                    i = todo.next()
+                except StopIteration:
+                    return
+            finally:
+                lock.release()
+            try:
+                results[i] = func(items[i])
+            except:
+                errors[i] = sys.exc_info()
+
+    threads = [threading.Thread(target=work)
+               for i in range(min(jobs, len(items)))]
+    for thread in threads:
+        thread.setDaemon(True)
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        t, v, tb = errors[min(errors)]
+        raise t, v, tb
+
+    return results
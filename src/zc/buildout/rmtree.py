@@ -15,15 +15,24 @@
 
 import shutil
 import os
-import doctest
+import stat
+import sys
+import tempfile
+import threading
+import zc.buildout.pool
 
-def rmtree (path):
+def rmtree (path, jobs=4):
     """
     A variant of shutil.rmtree which tries hard to be successful
     On windows shutil.rmtree aborts when it tries to delete a
     read only file.
     This tries to chmod the file to writeable and retries before giving up.
 
+    Directories whose permissions don't allow their contents to be
+    removed are fixed once, rather than for each file, and the
+    subdirectories of the tree are removed by a pool of up to jobs
+    threads.
+
     >>> from tempfile import mkdtemp
 
     Let's make a directory ...
@@ -52,15 +61,199 @@ def rmtree (path):
 
     >>> os.path.isdir (d)
     0
+
+    Subdirectories, including ones we can't write to, are removed too:
+
+    >>> d = mkdtemp()
+    >>> for name in 'abc':
+    ...     os.makedirs(os.path.join(d, name, 'sub'))
+    ...     open(os.path.join(d, name, 'sub', 'foo'), 'w').write('huhu')
+    ...     if hasattr(os, 'symlink'):
+    ...         os.symlink(d, os.path.join(d, name, 'link'))
+    >>> os.chmod(os.path.join(d, 'b', 'sub'), 0500)
+    >>> rmtree (d)
+    >>> os.path.isdir (d)
+    0
+    """
+    if os.path.islink(path):
+        # shutil.rmtree refuses to remove symbolic links
+        shutil.rmtree(path, onerror=_retry_writeable)
+        return
+
+    dirs = _clear(path)
+    if jobs > 1 and len(dirs) > 1:
+        zc.buildout.pool.map(_rmtree, dirs, jobs)
+    else:
+        for d in dirs:
+            _rmtree(d)
+    _rmdir(path)
+
+def _retry_writeable (func, path, exc):
+    os.chmod (path, 0600)
+    func (path)
+
+# Removing a directory with unlink fails on these platforms, so we can
+# try to remove each entry before checking whether it is a directory.
+_unlink_first = sys.platform.startswith('linux') or sys.platform == 'darwin'
+
+def _isdir(path):
+    try:
+        return stat.S_ISDIR(os.lstat(path).st_mode)
+    except OSError:
+        return False
+
+def _clear(path):
+    # Remove the files in a directory and return its subdirectories
+    if not os.access(path, os.R_OK | os.W_OK | os.X_OK):
+        os.chmod(path, 0700)
+    dirs = []
+    for name in os.listdir(path):
+        name = os.path.join(path, name)
+        if not _unlink_first and _isdir(name):
+            dirs.append(name)
+            continue
+        try:
+            os.remove(name)
+        except OSError:
+            if _unlink_first and _isdir(name):
+                dirs.append(name)
+            else:
+                _retry_writeable(os.remove, name, None)
+    return dirs
+
+def _rmtree(path):
+    for d in _clear(path):
+        _rmtree(d)
+    _rmdir(path)
+
+def _rmdir(path):
+    try:
+        os.rmdir(path)
+    except OSError:
+        _retry_writeable(os.rmdir, path, None)
+
+class Trash:
+    """Directories moved aside to be deleted by background threads
+
+    Renaming a directory into the trash directory is fast, and the
+    deletion is done by up to jobs threads while the caller goes on.
+    The threads aren't daemonic, so the process waits for them before
+    exiting.  Anything left in the trash, because the process was
+    killed, is deleted when a Trash is next created for it.
+
+    >>> d = tempfile.mkdtemp()
+    >>> part = os.path.join(d, 'part')
+    >>> os.mkdir(part)
+    >>> open(os.path.join(part, 'foo'), 'w').write('huhu')
+    >>> leftover = os.path.join(d, '.trash', 'leftover')
+    >>> os.makedirs(leftover)
+
+    >>> trash = Trash(os.path.join(d, '.trash'))
+    >>> trash.delete(part)
+    >>> os.path.exists(part)
+    False
+
+    The part can be replaced right away.  After the trash is drained,
+    the trash directory is gone too:
+
+    >>> os.mkdir(part)
+    >>> trash.drain()
+    >>> os.listdir(d)
+    ['part']
+    >>> rmtree(d)
     """
-    def retry_writeable (func, path, exc):
-        os.chmod (path, 0600)
-        func (path)
 
-    shutil.rmtree (path, onerror = retry_writeable)
+    def __init__(self, directory, jobs=2):
+        self.directory = directory
+        self.jobs = jobs
+        self.lock = threading.Lock()
+        self.todo = []
+        self.threads = []
+        if os.path.isdir(directory):
+            self.lock.acquire()
+            try:
+                for name in os.listdir(directory):
+                    self._put(os.path.join(directory, name))
+            finally:
+                self.lock.release()
+
+    def delete(self, path):
+        """Move a directory to the trash, to be deleted in the background
+
+        If the directory can't be moved, for example because it is a
+        symbolic link or is on another file system, it's deleted
+        right away.
+        """
+        moved = False
+        if not os.path.islink(path):
+            self.lock.acquire()
+            try:
+                if not os.path.isdir(self.directory):
+                    os.mkdir(self.directory)
+                dest = tempfile.mkdtemp(dir=self.directory)
+                try:
+                    os.rename(path,
+                              os.path.join(dest, os.path.basename(path)))
+                except OSError:
+                    os.rmdir(dest)
+                else:
+                    self._put(dest)
+                    moved = True
+            finally:
+                self.lock.release()
+        if not moved:
+            rmtree(path)
+
+    def drain(self):
+        """Wait for the directories in the trash to be deleted
+        """
+        while 1:
+            self.lock.acquire()
+            try:
+                threads = self.threads[:]
+            finally:
+                self.lock.release()
+            if not threads:
+                return
+            for thread in threads:
+                thread.join()
+
+    def _put(self, path):
+        # Must be called with the lock held
+        self.todo.append(path)
+        if len(self.threads) < self.jobs:
+            thread = threading.Thread(target=self._work,
+                                      name='buildout-trash')
+            self.threads.append(thread)
+            thread.start()
+
+    def _work(self):
+        thread = threading.currentThread()
+        while 1:
+            self.lock.acquire()
+            try:
+                if not self.todo:
+                    self.threads.remove(thread)
+                    if not self.threads:
+                        try:
+                            os.rmdir(self.directory)
+                        except OSError:
+                            pass # not empty, leave it for the next run
+                    return
+                path = self.todo.pop()
+            finally:
+                self.lock.release()
+            try:
+                # The workers are the pool, so each removes its
+                # directory on its own.
+                rmtree(path, jobs=1)
+            except (IOError, OSError):
+                pass # leave it for the next run
 
 def test_suite():
+    import doctest
     return doctest.DocTestSuite()
 
 if "__main__" == __name__:
+    import doctest
     doctest.testmod()
@@ -0,0 +1,393 @@
+##############################################################################
+#
+# Copyright (c) 2010 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Run buildouts in a resident process
+
+The buildout serve command listens on a Unix socket, named
+.buildout-serve, in the directory containing the buildout
+configuration file.  When the socket exists, the buildout script
+forwards install requests to the server, which runs them in-process,
+so that imported modules, package-index pages, scanned egg directories
+and parsed configuration files are reused from one run to the next.
+
+Cached configuration files and egg directories are checked for changes
+on every run.  If a module the server has imported changes, the server
+restarts itself and the request is run by the buildout script as
+usual.  Distributions activated by a run, such as recipes and
+extensions, and the modules imported from them, are dropped after the
+run, so that each run loads the ones its configuration asks for.
+"""
+
+import errno
+import logging
+import marshal
+import os
+import pkg_resources
+import socket
+import struct
+import sys
+import threading
+import traceback
+import zc.buildout
+import zc.buildout.buildout
+import zc.buildout.easy_install
+
+logger = logging.getLogger('zc.buildout')
+
+socket_name = '.buildout-serve'
+
+def socket_path(config_file):
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)),
+                        socket_name)
+
+# Messages are a one-character type followed by a length-prefixed
+# payload.  Requests are marshalled tuples.  Responses are output
+# written to the standard output ('o') or error ('e') file descriptors,
+# followed by the exit status ('x'), or a request to run locally ('l').
+
+def _send(sock, kind, data):
+    sock.sendall(kind + struct.pack('!I', len(data)) + data)
+
+def _recv_exactly(sock, size):
+    data = ''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+def _recv(sock):
+    header = _recv_exactly(sock, 5)
+    size, = struct.unpack('!I', header[1:])
+    return header[0], _recv_exactly(sock, size)
+
+def _connect(path):
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error, v:
+        sock.close()
+        if v.args[0] in (errno.ENOENT, errno.ECONNREFUSED):
+            return None
+        raise
+    return sock
+
+def forward(config_file, args):
+    """Run a buildout in the server for config_file, if there is one.
+
+    The output of the run is written to the standard output and error
+    and its exit status is returned.  None is returned if there is no
+    server or if the server asks for the buildout to be run locally.
+    """
+    if serving:
+        return None
+    sock = _connect(socket_path(config_file))
+    if sock is None:
+        return None
+    try:
+        _send(sock, 'r', marshal.dumps(
+            ('run', os.getcwd(), list(args), dict(os.environ))))
+        while 1:
+            try:
+                kind, data = _recv(sock)
+            except EOFError:
+                return None
+            if kind == 'o':
+                sys.stdout.write(data)
+                sys.stdout.flush()
+            elif kind == 'e':
+                sys.stderr.write(data)
+                sys.stderr.flush()
+            elif kind == 'x':
+                return int(data)
+            else:
+                return None
+    finally:
+        sock.close()
+
+def stop(config_file):
+    """Ask the server for config_file to stop.
+
+    False is returned if there is no server running.
+    """
+    sock = _connect(socket_path(config_file))
+    if sock is None:
+        return False
+    try:
+        _send(sock, 'r', marshal.dumps(('stop', )))
+        try:
+            _recv(sock)
+        except EOFError:
+            pass
+    finally:
+        sock.close()
+    return True
+
+
+serving = False
+
+class Server:
+
+    def __init__(self, path):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise zc.buildout.UserError(
+                "The serve command requires Unix domain sockets.")
+        sock = _connect(path)
+        if sock is not None:
+            sock.close()
+            raise zc.buildout.UserError(
+                "A buildout server is already running on %s." % path)
+        if os.path.exists(path):
+            os.remove(path) # left over from a server that died
+        self.path = path
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Only the user running the server may connect.  The umask is
+        # set while binding, so that the socket is never accessible to
+        # others.
+        umask = os.umask(0077)
+        try:
+            self.socket.bind(path)
+        finally:
+            os.umask(umask)
+        self.socket.listen(5)
+        self.restart = False
+        self._module_times = {}
+        self._check_modules()
+
+    def serve(self):
+        global serving
+        serving = True
+        old_configs = zc.buildout.buildout._parsed_configs
+        old_environments = zc.buildout.easy_install.cache_environments(True)
+        zc.buildout.buildout._parsed_configs = {}
+        try:
+            while 1:
+                conn = self.socket.accept()[0]
+                try:
+                    try:
+                        request = marshal.loads(_recv_request(conn))
+                        if request[0] == 'stop':
+                            logger.info("Stopping.")
+                            return
+                        if self._check_modules():
+                            logger.info("Modules have changed, restarting.")
+                            self.restart = True
+                            _send(conn, 'l', '')
+                            return
+                        cwd, args, environ = request[1:]
+                        logger.info("Running %r in %s.", args, cwd)
+                        _send(conn, 'x',
+                              str(self.run(conn, cwd, args, environ)))
+                    except (EOFError, socket.error):
+                        # The client went away.
+                        pass
+                finally:
+                    conn.close()
+        finally:
+            serving = False
+            zc.buildout.buildout._parsed_configs = old_configs
+            zc.buildout.easy_install.cache_environments(old_environments)
+            self.socket.close()
+            os.remove(self.path)
+
+    def _check_modules(self):
+        # Return whether any of the imported modules have changed
+        # since they were first seen.
+        changed = False
+        times = self._module_times
+        for module in sys.modules.values():
+            filename = getattr(module, '__file__', None)
+            if not filename:
+                continue
+            if filename[-4:] in ('.pyc', '.pyo'):
+                filename = filename[:-1]
+            try:
+                mtime = os.stat(filename).st_mtime
+            except OSError:
+                continue
+            if times.setdefault(filename, mtime) != mtime:
+                changed = True
+        return changed
+
+    def run(self, conn, cwd, args, environ):
+        """Run the buildout main program with the given arguments
+
+        The run uses the client's environment variables.  The standard
+        output and error file descriptors are redirected to the
+        connection, so that the output of subprocesses is forwarded
+        too.  The exit status is returned.
+        """
+        lock = threading.Lock()
+        saved = []
+        pumps = []
+        root_logger = logging.getLogger()
+        buildout_logger = logging.getLogger('zc.buildout')
+        logging_state = (root_logger.handlers[:], root_logger.level,
+                         buildout_logger.handlers[:],
+                         buildout_logger.propagate)
+        # The buildout being run sets up its own logging.
+        del root_logger.handlers[:]
+        del buildout_logger.handlers[:]
+        # Buildouts change the installer's class-level settings.
+        settings = dict([
+            (name, value)
+            for (name, value)
+            in zc.buildout.easy_install.Installer.__dict__.items()
+            if not name.startswith('__')
+            ])
+        old_environ = dict(os.environ)
+        old_path = sys.path[:]
+        ws_state = _working_set_state()
+        old_cwd = os.getcwd()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for fd, kind in (1, 'o'), (2, 'e'):
+            r, w = os.pipe()
+            saved.append((fd, os.dup(fd)))
+            os.dup2(w, fd)
+            os.close(w)
+            pump = threading.Thread(target=_pump, args=(r, conn, kind, lock))
+            pump.setDaemon(True)
+            pump.start()
+            pumps.append(pump)
+        try:
+            try:
+                _set_environ(environ)
+                os.chdir(cwd)
+                # Develop eggs may have changed since the last run, and
+                # new releases may have been made.
+                zc.buildout.buildout._dir_hashes.clear()
+                # Compiled option values would otherwise pile up over
+                # the life of the server.
+                zc.buildout.buildout._compiled_templates.clear()
+                zc.buildout.easy_install.clear_index_cache()
+                zc.buildout.buildout.main(args)
+                status = 0
+            except SystemExit, v:
+                status = v.code
+                if status is None:
+                    status = 0
+                elif not isinstance(status, int):
+                    sys.stderr.write(str(status) + '\n')
+                    status = 1
+            except:
+                traceback.print_exc()
+                status = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            for fd, old in saved:
+                os.dup2(old, fd)
+                os.close(old)
+            for pump in pumps:
+                pump.join()
+            os.chdir(old_cwd)
+            _set_environ(old_environ)
+            sys.path[:] = old_path
+            for filename in _restore_working_set(ws_state):
+                self._module_times.pop(filename, None)
+            root_logger.handlers[:] = logging_state[0]
+            root_logger.setLevel(logging_state[1])
+            buildout_logger.handlers[:] = logging_state[2]
+            buildout_logger.propagate = logging_state[3]
+            for name, value in settings.items():
+                setattr(zc.buildout.easy_install.Installer, name, value)
+        return status
+
+def _set_environ(environ):
+    for name in os.environ.keys():
+        if name not in environ:
+            del os.environ[name]
+    for name, value in environ.items():
+        if os.environ.get(name) != value:
+            os.environ[name] = value
+
+def _working_set_state():
+    ws = pkg_resources.working_set
+    return (ws.entries[:],
+            dict([(entry, keys[:]) for (entry, keys)
+                  in ws.entry_keys.items()]),
+            ws.by_key.copy())
+
+def _restore_working_set(state):
+    """Restore the working set, dropping the distributions added since
+
+    Modules imported from the dropped distributions are removed from
+    sys.modules, and their file names are returned.
+    """
+    ws = pkg_resources.working_set
+    entries, entry_keys, by_key = state
+    locations = [
+        os.path.normcase(os.path.abspath(dist.location))
+        for (key, dist) in ws.by_key.items()
+        if by_key.get(key) is not dist and dist.location
+        ]
+    ws.entries[:] = entries
+    ws.entry_keys.clear()
+    ws.entry_keys.update(entry_keys)
+    ws.by_key.clear()
+    ws.by_key.update(by_key)
+
+    removed = []
+    for name, module in sys.modules.items():
+        filename = getattr(module, '__file__', None)
+        if not filename:
+            continue
+        path = os.path.normcase(os.path.abspath(filename))
+        for location in locations:
+            if path == location or path.startswith(location + os.path.sep):
+                del sys.modules[name]
+                if filename[-4:] in ('.pyc', '.pyo'):
+                    filename = filename[:-1]
+                removed.append(filename)
+                break
+    return removed
+
+def _recv_request(conn):
+    kind, data = _recv(conn)
+    if kind != 'r':
+        raise EOFError
+    return data
+
+def _pump(fd, conn, kind, lock):
+    # Copy the output written to a pipe to the connection, until the
+    # pipe is closed.
+    while 1:
+        data = os.read(fd, 8192)
+        if not data:
+            break
+        lock.acquire()
+        try:
+            try:
+                _send(conn, kind, data)
+            except socket.error:
+                pass # the client went away; keep draining the pipe
+        finally:
+            lock.release()
+    os.close(fd)
+
+def serve(config_file):
+    """Serve buildout requests for config_file until asked to stop
+    """
+    server = Server(socket_path(config_file))
+    logger.info("Serving buildout requests on %s.", server.path)
+    server.serve()
+    if server.restart:
+        args = sys.argv[:]
+        if not __debug__:
+            args.insert(0, '-O')
+        args.insert(0, sys.executable)
+        os.execv(sys.executable, args)
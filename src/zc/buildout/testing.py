@@ -16,6 +16,12 @@
 $Id$
 """
 
+try:
+    from hashlib import md5
+except ImportError:
+    # Python 2.4 and older
+    from md5 import md5
+
 import BaseHTTPServer
 import errno
 import logging
@@ -25,6 +31,7 @@ import random
 import re
 import shutil
 import socket
+import SocketServer
 import subprocess
 import sys
 import tempfile
@@ -135,6 +142,39 @@ def bdist_egg(setup, executable, dest=None):
         assert executable == sys.executable, (executable, sys.executable)
     _runsetup(setup, 'bdist_egg', '-d', dest)
 
+def create_egg_dir(dest, project, version='1.0', files=None):
+    """Create an unzipped egg for a project in the dest directory
+
+    files maps '/'-separated paths in the egg to their contents.  The
+    distribution of the egg is returned.
+    """
+    egg = os.path.join(dest, '%s-%s-py%s.egg'
+                       % (project, version, sys.version[:3]))
+    os.makedirs(os.path.join(egg, 'EGG-INFO'))
+    write(egg, 'EGG-INFO', 'PKG-INFO',
+          'Metadata-Version: 1.0\nName: %s\nVersion: %s\n'
+          % (project, version))
+    for path, data in sorted((files or {}).items()):
+        path = path.split('/')
+        if not os.path.isdir(os.path.join(egg, *path[:-1])):
+            os.makedirs(os.path.join(egg, *path[:-1]))
+        write(egg, *(path + [data]))
+    return list(pkg_resources.find_distributions(egg))[0]
+
+def create_recipe(dest, source, name='recipe'):
+    """Create a develop project providing a default recipe
+
+    The project has a single module, with the given name and source,
+    whose Recipe class is the recipe.
+    """
+    os.mkdir(dest)
+    write(dest, 'setup.py',
+          "from setuptools import setup\n"
+          "setup(name=%r, py_modules=[%r],\n"
+          "      entry_points={'zc.buildout': ['default = %s:Recipe']})\n"
+          % (name, name, name))
+    write(dest, name+'.py', source)
+
 def wait_until(label, func, *args, **kw):
     if 'timeout' in kw:
         kw = dict(kw)
@@ -244,6 +284,8 @@ def buildoutSetUp(test):
         join = os.path.join,
         sdist = sdist,
         bdist_egg = bdist_egg,
+        create_egg_dir = create_egg_dir,
+        create_recipe = create_recipe,
         start_server = start_server,
         buildout = os.path.join(sample, 'bin', 'buildout'),
         wait_until = wait_until,
@@ -255,11 +297,18 @@ def buildoutTearDown(test):
     for f in test.globs['__tear_downs']:
         f()
 
-class Server(BaseHTTPServer.HTTPServer):
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    # Let serve_forever notice a stop request made from another thread.
+    timeout = 0.05
 
     def __init__(self, tree, *args):
         BaseHTTPServer.HTTPServer.__init__(self, *args)
         self.tree = os.path.abspath(tree)
+        self.stats_lock = threading.Lock()
+        self.connections = self.requests = self.bytes = 0
 
     __run = True
     def serve_forever(self):
@@ -267,32 +316,73 @@ class Server(BaseHTTPServer.HTTPServer):
             self.handle_request()
 
     def handle_error(self, *_):
-        self.__run = False
+        if not isinstance(sys.exc_info()[1], socket.error):
+            # Clients dropping kept-alive connections are not fatal,
+            # anything else, including __stop__ requests, is.
+            self.__run = False
+
+    def count(self, connections=0, requests=0, bytes=0):
+        self.stats_lock.acquire()
+        try:
+            self.connections += connections
+            self.requests += requests
+            self.bytes += bytes
+        finally:
+            self.stats_lock.release()
+
+    def stats(self):
+        return ''.join(['%s: %s\n' % (name, getattr(self, name))
+                        for name in ('connections', 'requests', 'bytes')])
 
 class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
 
     Server.__log = False
 
+    protocol_version = 'HTTP/1.1'
+
     def __init__(self, request, address, server):
         self.__server = server
+        self.__counted = False
         self.tree = server.tree
         BaseHTTPServer.BaseHTTPRequestHandler.__init__(
             self, request, address, server)
 
     def do_GET(self):
+        self.__serve(True)
+
+    def do_HEAD(self):
+        self.__serve(False)
+
+    def __serve(self, body):
         if '__stop__' in self.path:
             raise SystemExit
 
         if self.path == '/enable_server_logging':
             self.__server.__log = True
             self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
             return
 
         if self.path == '/disable_server_logging':
             self.__server.__log = False
             self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if self.path == '/__stats__':
+            out = self.__server.stats()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(out)))
+            self.send_header('Content-Type', 'text/plain')
+            self.end_headers()
+            if body:
+                self.wfile.write(out)
             return
 
+        self.count_request()
+
         path = os.path.abspath(os.path.join(self.tree, *self.path.split('/')))
         if not (
             ((path == self.tree) or path.startswith(self.tree+os.path.sep))
@@ -300,16 +390,14 @@ class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
             os.path.exists(path)
             ):
             self.send_response(404, 'Not Found')
-            #self.send_response(200)
             out = '<html><body>Not Found</body></html>'
-            #out = '\n'.join(self.tree, self.path, path)
             self.send_header('Content-Length', str(len(out)))
             self.send_header('Content-Type', 'text/html')
             self.end_headers()
-            self.wfile.write(out)
+            if body:
+                self.write(out)
             return
 
-        self.send_response(200)
         if os.path.isdir(path):
             out = ['<html><body>\n']
             names = os.listdir(path)
@@ -320,22 +408,94 @@ class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
                 out.append('<a href="%s">%s</a><br>\n' % (name, name))
             out.append('</body></html>\n')
             out = ''.join(out)
-            self.send_header('Content-Length', str(len(out)))
-            self.send_header('Content-Type', 'text/html')
+            etag = '"%s"' % md5(out).hexdigest()
+            content_type = 'text/html'
         else:
             out = open(path, 'rb').read()
-            self.send_header('Content-Length', len(out))
+            st = os.stat(path)
+            etag = '"%x-%x"' % (st.st_size, int(st.st_mtime))
             if path.endswith('.egg'):
-                self.send_header('Content-Type', 'application/zip')
+                content_type = 'application/zip'
             elif path.endswith('.gz'):
-                self.send_header('Content-Type', 'application/x-gzip')
+                content_type = 'application/x-gzip'
             elif path.endswith('.zip'):
-                self.send_header('Content-Type', 'application/x-gzip')
+                content_type = 'application/x-gzip'
             else:
-                self.send_header('Content-Type', 'text/html')
+                content_type = 'text/html'
+
+        if etag in [tag.strip() for tag in
+                    self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304, 'Not Modified')
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        status = 200
+        content_range = None
+        byte_range = self.__byte_range(len(out))
+        if byte_range is not None:
+            if byte_range == 'unsatisfiable':
+                self.send_response(416, 'Requested Range Not Satisfiable')
+                self.send_header('Content-Range', 'bytes */%s' % len(out))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            start, end = byte_range
+            content_range = 'bytes %s-%s/%s' % (start, end, len(out))
+            out = out[start:end+1]
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(out)))
+        self.send_header('Content-Type', content_type)
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        if content_range:
+            self.send_header('Content-Range', content_range)
         self.end_headers()
 
-        self.wfile.write(out)
+        if body:
+            self.write(out)
+
+    __range = re.compile(r'bytes=(\d*)-(\d*)$').match
+    def __byte_range(self, size):
+        # Return (start, end) for a single satisfiable byte range,
+        # 'unsatisfiable', or None to serve the whole entity.
+        header = self.headers.get('Range')
+        if not header:
+            return None
+        match = self.__range(header.strip())
+        if match is None:
+            return None # Multiple or invalid ranges, ignore them
+        start, end = match.groups()
+        if not start:
+            if not end:
+                return None
+            # suffix range: the last N bytes
+            if int(end) == 0:
+                return 'unsatisfiable'
+            start, end = max(0, size - int(end)), size-1
+        else:
+            start = int(start)
+            if end:
+                end = min(int(end), size-1)
+            else:
+                end = size-1
+        if start > end or start >= size:
+            return 'unsatisfiable'
+        return start, end
+
+    def count_request(self):
+        if self.__counted:
+            self.__server.count(requests=1)
+        else:
+            # Only count connections that make non-control requests.
+            self.__counted = True
+            self.__server.count(connections=1, requests=1)
+
+    def write(self, data):
+        self.wfile.write(data)
+        self.__server.count(bytes=len(data))
 
     def log_request(self, code):
         if self.__server.__log:
@@ -380,8 +540,8 @@ def stop_server(url, thread=None):
 
 def wait(port, up):
     addr = 'localhost', port
-    for i in range(120):
-        time.sleep(0.25)
+    for i in range(3000):
+        time.sleep(0.01)
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             s.connect(addr)
@@ -1249,6 +1249,7 @@ uninstall
     [buildout]
     ...
     [foo]
+    __buildout_digest__ = ...
     __buildout_installed__ = a
     	b
     	c
@@ -2602,6 +2603,1416 @@ def increment_on_command_line():
       recipe='zc.buildout:debug'
     """
 
+def substitutions_are_compiled_once():
+    r"""
+Option values are compiled into tokens once and references are
+resolved with a set of options being computed, so long reference
+chains are cheap and give the same results as before:
+
+    >>> import zc.buildout.buildout
+    >>> lines = ['[buildout]', 'parts =', 'o0 = $${x} 0 $$']
+    >>> for i in range(1, 500):
+    ...     lines.append('o%d = ${buildout:o%d}/%d' % (i, i-1, i))
+    >>> write('buildout.cfg', '\n'.join(lines)+'\n')
+    >>> b = zc.buildout.buildout.Buildout('buildout.cfg', [])
+    >>> b['buildout']['o3']
+    '$${x} 0 $$/1/2/3'
+    >>> len(b['buildout']['o499'].split('/'))
+    500
+
+The same template is compiled only once:
+
+    >>> zc.buildout.buildout._compile_template('a ${x:y} $${z}') is (
+    ...     zc.buildout.buildout._compile_template('a ${x:y} $${z}'))
+    True
+    >>> zc.buildout.buildout._compile_template('a ${x:y} $${z} ${:a:b}')
+    ... # doctest: +NORMALIZE_WHITESPACE
+    ('a ', ('x', 'y'), ' ', '$$', '{z} ',
+     (None, 'The substitution, ${:a:b},\nhas too many colons.'))
+    """
+
+def recipe_signatures_are_computed_once_per_recipe():
+    r"""
+Recipes are loaded, and their signatures computed, once for each
+recipe requirement, no matter how many parts use the recipe:
+
+    >>> import pkg_resources, zc.buildout.buildout
+    >>> lines = ['[buildout]', 'parts =']
+    >>> for i in range(40):
+    ...     lines.extend(['[p%d]' % i, 'recipe = zc.buildout:debug'])
+    >>> lines.extend(['[other]', 'recipe = zc.recipe.egg'])
+    >>> write('buildout.cfg', '\n'.join(lines)+'\n')
+    >>> b = zc.buildout.buildout.Buildout('buildout.cfg', [])
+
+    >>> resolved = []
+    >>> resolve = pkg_resources.working_set.resolve
+    >>> def counting_resolve(requirements, *args, **kw):
+    ...     resolved.extend([str(r) for r in requirements])
+    ...     return resolve(requirements, *args, **kw)
+    >>> pkg_resources.working_set.resolve = counting_resolve
+    >>> register_teardown(
+    ...     lambda: pkg_resources.working_set.__dict__.pop('resolve', None))
+    >>> parts = ['p%d' % i for i in range(40)] + ['other']
+    >>> _ = [b[part]['recipe'] for part in parts]
+    >>> resolved
+    ['setuptools', 'zc.buildout>=1.2.0', 'setuptools']
+
+    >>> del resolved[:]
+    >>> b._compute_part_signatures(parts)
+    >>> del pkg_resources.working_set.resolve
+    >>> resolved
+    ['zc.buildout', 'zc.recipe.egg']
+
+    >>> b['p0']['__buildout_signature__'] == (
+    ...     b['p39']['__buildout_signature__'])
+    True
+    >>> b['p0']['__buildout_signature__'] == (
+    ...     b['other']['__buildout_signature__'])
+    False
+    """
+
+def lazy_sections():
+    r"""
+With the lazy-sections option, substitutions are done when options are
+used and parts are only initialized when installing.  Sections that
+aren't used don't need to be valid:
+
+    >>> write('buildout.cfg', '''
+    ... [buildout]
+    ... parts = p1
+    ... lazy-sections = true
+    ... unused = ${data:x}
+    ...
+    ... [data]
+    ... x = 1
+    ... broken = ${nonexistent:option}
+    ...
+    ... [p1]
+    ... recipe = zc.buildout:debug
+    ... foo = ${data:x} ${p2:bar}
+    ...
+    ... [p2]
+    ... recipe = zc.buildout:debug
+    ... bar = 2
+    ... ''')
+
+    >>> import zc.buildout.buildout
+    >>> b = zc.buildout.buildout.Buildout('buildout.cfg', [])
+    >>> b['data']['x']
+    '1'
+    >>> hasattr(b['p1'], 'recipe')
+    False
+
+Referenced parts are still installed first and unused options are
+still reported:
+
+    >>> print system(buildout),
+    Unused options for buildout: 'unused'.
+    Installing p2.
+      bar='2'
+      recipe='zc.buildout:debug'
+    Installing p1.
+      foo='1 2'
+      recipe='zc.buildout:debug'
+
+    >>> cat('.installed.cfg') # doctest: +ELLIPSIS
+    [buildout]
+    ...
+    [p1]
+    __buildout_digest__ = ...
+    __buildout_installed__ = 
+    __buildout_signature__ = zc.buildout-...
+    foo = 1 2
+    recipe = zc.buildout:debug
+
+Without the option, the broken section is an error:
+
+    >>> write('buildout.cfg', '''
+    ... [buildout]
+    ... parts =
+    ...
+    ... [data]
+    ... broken = ${nonexistent:option}
+    ... ''')
+    >>> zc.buildout.buildout.Buildout('buildout.cfg', [])['data']
+    Traceback (most recent call last):
+    ...
+    MissingSection: The referenced section, 'nonexistent', was not defined.
+    """
+
+def installed_options_digest():
+    r"""
+A digest of each part's options is saved in .installed.cfg, so the
+check for changed options is a single comparison:
+
+    >>> write('buildout.cfg', '''
+    ... [buildout]
+    ... parts = p1
+    ...
+    ... [p1]
+    ... recipe = zc.buildout:debug
+    ... foo = 1
+    ... ''')
+
+    >>> print system(buildout),
+    Installing p1.
+      foo='1'
+      recipe='zc.buildout:debug'
+
+    >>> import zc.buildout.buildout
+    >>> installed = open('.installed.cfg').read()
+    >>> b = zc.buildout.buildout.Buildout('buildout.cfg', [])
+    >>> b._compute_part_signatures(['p1'])
+    >>> ('__buildout_digest__ = %s\n'
+    ...  % zc.buildout.buildout._options_digest(b['p1'])) in installed
+    True
+
+    >>> print system(buildout),
+    Updating p1.
+      foo='1'
+      recipe='zc.buildout:debug'
+
+.installed.cfg files written by older versions of buildout don't
+have digests, in which case the options are compared:
+
+    >>> import re
+    >>> write('.installed.cfg',
+    ...       re.sub('__buildout_digest__ = .*\n', '', installed))
+    >>> print system(buildout),
+    Updating p1.
+      foo='1'
+      recipe='zc.buildout:debug'
+
+    >>> print system(buildout+' p1:foo=2'),
+    Uninstalling p1.
+    Installing p1.
+      foo='2'
+      recipe='zc.buildout:debug'
+    """
+
+def verify_installed():
+    r"""
+Before updating an unchanged part, buildout checks that the files it
+installed still exist.  By default, every file is checked:
+
+    >>> create_recipe('recipe',
+    ... '''
+    ... import os
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         self.n = int(options['files'])
+    ...     def install(self):
+    ...         if not os.path.exists('out'):
+    ...             os.makedirs(os.path.join('out', 'sub'))
+    ...         r = [os.path.join('out', 'sub', str(i)) for i in range(self.n)]
+    ...         for p in r: open(p, 'w').close()
+    ...         return r
+    ...     update = install
+    ... ''')
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = foo
+    ...
+    ... [foo]
+    ... recipe = recipe
+    ... files = 150
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing foo.
+
+    >>> remove('out', 'sub', '42')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Uninstalling foo.
+    Installing foo.
+
+With verify-installed set to roots, only the directories containing the
+installed files are checked:
+
+    >>> remove('out', 'sub', '42')
+    >>> print system(buildout+' buildout:verify-installed=roots'),
+    Develop: '/sample-buildout/recipe'
+    Updating foo.
+
+    >>> import zc.buildout.buildout
+    >>> zc.buildout.buildout._installed_roots(
+    ...     [join(sample_buildout, 'out', 'sub', '1'),
+    ...      join(sample_buildout, 'out', 'sub', '2'),
+    ...      join(sample_buildout, 'out', 'x'),
+    ...      join(sample_buildout, 'bin', 'x'),
+    ...      join(sample_buildout, 'bin', 'y')],
+    ...     [sample_buildout, join(sample_buildout, 'bin')], sample_buildout)
+    ['/sample-buildout/bin/x', '/sample-buildout/bin/y', '/sample-buildout/out']
+
+Files outside the buildout aren't replaced by the directories
+containing them:
+
+    >>> zc.buildout.buildout._installed_roots(
+    ...     ['/etc/foo.conf', '/etc/bar.conf'], [], sample_buildout)
+    ['/etc/bar.conf', '/etc/foo.conf']
+
+    >>> remove('out')
+    >>> print system(buildout+' buildout:verify-installed=roots'),
+    Develop: '/sample-buildout/recipe'
+    Uninstalling foo.
+    Installing foo.
+
+and with none, the installed files aren't checked at all:
+
+    >>> remove('out')
+    >>> print system(buildout+' buildout:verify-installed=none'),
+    Develop: '/sample-buildout/recipe'
+    Updating foo.
+
+    >>> print system(buildout+' buildout:verify-installed=some'),
+    While:
+      Initializing.
+    Error: Invalid value for verify-installed option: some
+
+When there are many installed files, they are checked using a pool of
+threads:
+
+    >>> import zc.buildout.pool
+    >>> zc.buildout.pool.map(lambda i: i*2, range(10), 4)
+    [0, 2, 4, 6, 8, 10, 12, 14, 16, 18]
+
+    >>> def f(i):
+    ...     if i % 3 == 2:
+    ...         raise ValueError(i)
+    ...     return i
+    >>> zc.buildout.pool.map(f, range(10), 4)
+    Traceback (most recent call last):
+    ...
+    ValueError: 2
+    """
+
+def background_uninstall():
+    r"""
+With the background-uninstall option, directories of uninstalled parts
+are moved to a .trash directory and deleted while buildout goes on:
+
+    >>> create_recipe('recipe',
+    ... '''
+    ... import os
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         self.options = options
+    ...     def install(self):
+    ...         os.mkdir('out')
+    ...         open(os.path.join('out', 'data'), 'w').write(
+    ...             self.options['data'])
+    ...         return ['out']
+    ...     def update(self):
+    ...         pass
+    ... ''')
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = foo
+    ... background-uninstall = true
+    ...
+    ... [foo]
+    ... recipe = recipe
+    ... data = 1
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing foo.
+
+    >>> print system(buildout+' foo:data=2'),
+    Develop: '/sample-buildout/recipe'
+    Uninstalling foo.
+    Installing foo.
+
+    >>> cat('out', 'data')
+    2
+
+The trash is emptied before buildout exits:
+
+    >>> os.path.exists('.trash')
+    False
+
+A trash left behind by an interrupted run is emptied by the next run,
+even without the option:
+
+    >>> mkdir('.trash')
+    >>> mkdir('.trash', 'tmpXXX')
+    >>> mkdir('.trash', 'tmpXXX', 'out')
+    >>> print system(buildout+' buildout:background-uninstall=false'
+    ...              ' foo:data=2'),
+    Develop: '/sample-buildout/recipe'
+    Updating foo.
+    >>> os.path.exists('.trash')
+    False
+    """
+
+def develop_skip_unchanged():
+    r"""
+Normally, every develop path is developed again on each run.  With
+the develop-skip-unchanged option, a fingerprint of each path's
+setup.py, setup.cfg and egg-info is saved, and paths that haven't
+changed are left alone:
+
+    >>> mkdir('foo')
+    >>> write('foo', 'setup.py',
+    ... '''
+    ... from setuptools import setup
+    ... setup(name='foo')
+    ... ''')
+    >>> mkdir('bar')
+    >>> write('bar', 'setup.py',
+    ... '''
+    ... from setuptools import setup
+    ... setup(name='bar')
+    ... ''')
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = foo bar
+    ... develop-skip-unchanged = true
+    ... parts =
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/foo'
+    Develop: '/sample-buildout/bar'
+
+    >>> print system(buildout),
+
+    >>> ls('develop-eggs')
+    -  bar.egg-link
+    -  foo.egg-link
+    -  zc.recipe.egg.egg-link
+
+If a setup script changes, or the egg-info is removed, the path is
+developed again:
+
+    >>> write('foo', 'setup.py',
+    ... '''
+    ... from setuptools import setup
+    ... setup(name='foo', version='1.0')
+    ... ''')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/foo'
+
+    >>> remove('bar', 'bar.egg-info')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/bar'
+
+    >>> print system(buildout),
+
+Develop paths that are no longer used are still uninstalled:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = foo
+    ... develop-skip-unchanged = true
+    ... parts =
+    ... ''')
+    >>> print system(buildout),
+
+    >>> ls('develop-eggs')
+    -  foo.egg-link
+    -  zc.recipe.egg.egg-link
+    """
+
+def develop_concurrency():
+    r"""
+With the develop-concurrency option, several develop paths are
+developed at the same time.  The output of each setup script is shown
+after all of them have finished:
+
+    >>> for name in 'foo', 'bar', 'baz':
+    ...     mkdir(name)
+    ...     write(name, 'setup.py',
+    ...           'from setuptools import setup\n'
+    ...           'print %r\n'
+    ...           'setup(name=%r)\n' % ('hi from '+name, name))
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = foo bar baz
+    ... develop-concurrency = 2
+    ... parts =
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/foo'
+    Develop: '/sample-buildout/bar'
+    Develop: '/sample-buildout/baz'
+    Output of develop '/sample-buildout/foo':
+    hi from foo
+    Output of develop '/sample-buildout/bar':
+    hi from bar
+    Output of develop '/sample-buildout/baz':
+    hi from baz
+
+    >>> ls('develop-eggs')
+    -  bar.egg-link
+    -  baz.egg-link
+    -  foo.egg-link
+    -  zc.recipe.egg.egg-link
+
+If any of them fails, none of the new develop eggs are kept:
+
+    >>> write('bar', 'setup.py', 'raise ValueError(42)\n')
+    >>> print system(buildout), # doctest: +ELLIPSIS
+    Develop: '/sample-buildout/foo'
+    Develop: '/sample-buildout/bar'
+    Develop: '/sample-buildout/baz'
+    Output of develop '/sample-buildout/foo':
+    hi from foo
+    Output of develop '/sample-buildout/bar':
+    Traceback (most recent call last):
+    ...
+    ValueError: 42
+    Output of develop '/sample-buildout/baz':
+    hi from baz
+    While:
+      Installing.
+      Processing directories listed in the develop option
+      Processing develop directory '/sample-buildout/bar'.
+    <BLANKLINE>
+    An internal error occured due to a bug in either zc.buildout or in a
+    recipe being used:
+    Traceback (most recent call last):
+    ...
+    Exception: Failed to run command:
+    ...
+
+    >>> ls('develop-eggs')
+    -  zc.recipe.egg.egg-link
+
+    >>> print system(buildout+' buildout:develop-concurrency=0'),
+    While:
+      Initializing.
+    Error: Invalid value for develop-concurrency option: 0
+    """
+
+def startup_imports():
+    """
+Importing the buildout module doesn't import the libraries that are
+only needed to unpack archives or run tests, so commands that don't
+need them start faster:
+
+    >>> import subprocess
+    >>> env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    >>> p = subprocess.Popen(
+    ...     [sys.executable, '-c',
+    ...      'import sys, zc.buildout.buildout; '
+    ...      'print [name for name in sys.argv[1:] if name in sys.modules]',
+    ...      'setuptools.archive_util', 'setuptools.command.setopt',
+    ...      'doctest', 'unittest', 'pdb', 'tarfile'],
+    ...     stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env)
+    >>> print p.communicate()[0],
+    []
+    """
+
+def upgrade_check_interval():
+    """
+By default, buildout checks for upgrades of zc.buildout and setuptools
+every time it runs in newest mode.  With the upgrade-check-interval
+option, the result of a check that found nothing to upgrade is
+recorded and reused for the given interval:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... parts =
+    ... upgrade-check-interval = 1d
+    ... ''')
+
+    >>> print system(buildout+' -v'), # doctest: +ELLIPSIS
+    Installing 'zc.buildout', 'setuptools'.
+    We have a develop egg: zc.buildout V
+    ...
+    >>> os.path.exists('.upgrade-check')
+    True
+
+    >>> print system(buildout+' -v'), # doctest: +ELLIPSIS
+    Skipping upgrade check, last checked ... seconds ago.
+
+The -n option always checks:
+
+    >>> print system(buildout+' -v -n'), # doctest: +ELLIPSIS
+    Installing 'zc.buildout', 'setuptools'.
+    We have a develop egg: zc.buildout V
+    ...
+
+as does a change to the settings the check depends on:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... parts =
+    ... upgrade-check-interval = 1d
+    ... find-links = %(link_server)s
+    ... ''' % globals())
+
+    >>> print system(buildout+' -v'), # doctest: +ELLIPSIS
+    Installing 'zc.buildout', 'setuptools'.
+    We have a develop egg: zc.buildout V
+    ...
+    >>> print system(buildout+' -v'), # doctest: +ELLIPSIS
+    Skipping upgrade check, last checked ... seconds ago.
+
+or an expired interval:
+
+    >>> import time
+    >>> os.utime('.upgrade-check', (time.time()-86401, time.time()-86401))
+    >>> print system(buildout+' -v'), # doctest: +ELLIPSIS
+    Installing 'zc.buildout', 'setuptools'.
+    We have a develop egg: zc.buildout V
+    ...
+
+The interval is a number of seconds, or a number followed by s, m, h,
+d or w, for seconds, minutes, hours, days or weeks:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... parts =
+    ... upgrade-check-interval = soon
+    ... ''')
+
+    >>> print system(buildout),
+    While:
+      Initializing.
+    Error: Invalid value for upgrade-check-interval option: soon
+    """
+
+def buildout_serve():
+    """
+The serve command keeps buildout loaded in a server process, which
+listens on a socket next to the configuration file:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... parts = debug
+    ...
+    ... [debug]
+    ... recipe = zc.buildout:debug
+    ... color = red
+    ... ''')
+
+    >>> import subprocess, time
+    >>> server = subprocess.Popen(
+    ...     [buildout, 'serve'], stdout=open('serve.log', 'w'),
+    ...     stderr=subprocess.STDOUT)
+    >>> for i in range(100):
+    ...     if os.path.exists('.buildout-serve'):
+    ...         break
+    ...     time.sleep(0.1)
+
+While it runs, buildouts for the configuration are run by the server,
+which sends their output and exit status back:
+
+    >>> print system(buildout),
+    Installing debug.
+      color='red'
+      recipe='zc.buildout:debug'
+
+    >>> print system(buildout+' debug:color=blue'),
+    Uninstalling debug.
+    Installing debug.
+      color='blue'
+      recipe='zc.buildout:debug'
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... parts = debug
+    ...
+    ... [debug]
+    ... recipe = zc.buildout:debug
+    ... color = green
+    ... ''')
+
+    >>> print system(buildout),
+    Uninstalling debug.
+    Installing debug.
+      color='green'
+      recipe='zc.buildout:debug'
+
+    >>> print system(buildout+" 'debug:color=${missing:color}'"),
+    While:
+      Installing.
+      Getting section debug.
+      Initializing section debug.
+      Getting option debug:color.
+      Getting section missing.
+    Error: The referenced section, 'missing', was not defined.
+
+Runs use the client's environment variables.  Recipes are loaded
+afresh for each run, and the path changes made by a run are undone:
+
+    >>> create_recipe('recipe',
+    ... '''
+    ... import os, sys
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         print 'greeting', os.environ.get('GREETING')
+    ...         print sys.path.count(
+    ...             buildout['buildout']['develop-eggs-directory'])
+    ...     def install(self):
+    ...         return ()
+    ...     update = install
+    ... ''')
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = greet
+    ...
+    ... [greet]
+    ... recipe = recipe
+    ... ''')
+
+    >>> print system('GREETING=hello '+buildout),
+    Develop: '/sample-buildout/recipe'
+    greeting hello
+    1
+    Uninstalling debug.
+    Installing greet.
+
+    >>> write('recipe', 'recipe.py',
+    ... '''
+    ... import os, sys
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         print 'salutation', os.environ.get('GREETING')
+    ...         print sys.path.count(
+    ...             buildout['buildout']['develop-eggs-directory'])
+    ...     def install(self):
+    ...         return ()
+    ...     update = install
+    ... ''')
+    >>> if os.path.exists(join('recipe', 'recipe.pyc')):
+    ...     remove('recipe', 'recipe.pyc') # may be as recent as recipe.py
+    >>> print system('GREETING=bye '+buildout),
+    Develop: '/sample-buildout/recipe'
+    salutation bye
+    1
+    Uninstalling greet.
+    Installing greet.
+
+Only one server can run for a configuration:
+
+    >>> print system(buildout+' serve'),
+    While:
+      Serving.
+    Error: A buildout server is already running on /sample-buildout/.buildout-serve.
+
+The server is stopped with the stop argument:
+
+    >>> print system(buildout+' serve stop'),
+    >>> server.wait()
+    0
+    >>> os.path.exists('.buildout-serve')
+    False
+    >>> cat('serve.log')
+    Serving buildout requests on /sample-buildout/.buildout-serve.
+    Running [] in /sample-buildout.
+    Running ['debug:color=blue'] in /sample-buildout.
+    Running [] in /sample-buildout.
+    Running ['debug:color=${missing:color}'] in /sample-buildout.
+    Running [] in /sample-buildout.
+    Running [] in /sample-buildout.
+    Stopping.
+
+Without a server, buildouts run as usual:
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    salutation None
+    1
+    Updating greet.
+
+    >>> print system(buildout+' serve stop'),
+    No buildout server is running.
+    """
+
+def buildout_watch():
+    """
+The watch command installs the parts that have changed whenever the
+configuration files, develop directories or egg directories change:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... parts = paint brush ladder
+    ... watch-interval = 1
+    ...
+    ... [paint]
+    ... recipe = zc.buildout:debug
+    ... color = red
+    ...
+    ... [brush]
+    ... recipe = zc.buildout:debug
+    ... color = ${paint:recipe}
+    ...
+    ... [ladder]
+    ... recipe = zc.buildout:debug
+    ... steps = 3
+    ... ''')
+
+    >>> import signal, subprocess, time
+    >>> def wait_for(text, count):
+    ...     for i in range(300):
+    ...         if open('watch.log').read().count(text) >= count:
+    ...             break
+    ...         time.sleep(0.1)
+    ...     else:
+    ...         print 'Timed out'
+
+    >>> watcher = subprocess.Popen(
+    ...     [buildout, 'watch'], stdout=open('watch.log', 'w'),
+    ...     stderr=subprocess.STDOUT)
+    >>> wait_for('Watching for changes.', 1)
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... parts = paint brush ladder
+    ... watch-interval = 1
+    ...
+    ... [paint]
+    ... recipe = zc.buildout:debug
+    ... color = yellow
+    ...
+    ... [brush]
+    ... recipe = zc.buildout:debug
+    ... color = ${paint:recipe}
+    ...
+    ... [ladder]
+    ... recipe = zc.buildout:debug
+    ... steps = 3
+    ... ''')
+    >>> wait_for('Watching for changes.', 2)
+
+The brush part refers to the paint section, but the value it uses
+didn't change, so, like the ladder part, it isn't touched.  Unchanged
+parts aren't updated either:
+
+    >>> os.kill(watcher.pid, signal.SIGINT)
+    >>> _ = watcher.wait()
+    >>> cat('watch.log')
+    Installing paint.
+      color='red'
+      recipe='zc.buildout:debug'
+    Installing brush.
+      color='zc.buildout:debug'
+      recipe='zc.buildout:debug'
+    Installing ladder.
+      recipe='zc.buildout:debug'
+      steps='3'
+    Watching for changes.
+    Uninstalling paint.
+    Installing paint.
+      color='yellow'
+      recipe='zc.buildout:debug'
+    Watching for changes.
+
+The once argument installs the changed parts without watching:
+
+    >>> print system(buildout+' watch once'),
+    No parts have changed.
+
+    >>> print system(buildout+' ladder:steps=4 watch once'),
+    Uninstalling ladder.
+    Installing ladder.
+      recipe='zc.buildout:debug'
+      steps='4'
+
+Parts that are no longer used are uninstalled:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... parts = paint
+    ...
+    ... [paint]
+    ... recipe = zc.buildout:debug
+    ... color = yellow
+    ... ''')
+
+    >>> print system(buildout+' watch once'),
+    Uninstalling ladder.
+    Uninstalling brush.
+    """
+
+def bundles_leave_out_eggs_that_are_not_zip_safe():
+    """
+Eggs that aren't marked as zip safe, or contain extension modules,
+stay on the path of scripts using bundles:
+
+    >>> eggs = tmpdir('eggs')
+    >>> ws = pkg_resources.WorkingSet([])
+    >>> for name, files in [('safe', {'EGG-INFO/zip-safe': ''}),
+    ...                     ('unsafe', {'EGG-INFO/not-zip-safe': ''}),
+    ...                     ('ext', {'EGG-INFO/zip-safe': '', 'ext.so': ''}),
+    ...                     ('plain', {})]:
+    ...     files[name+'.py'] = 'def main(): print 42\\n'
+    ...     ws.add(create_egg_dir(eggs, name, files=files))
+    >>> bin = tmpdir('bin')
+    >>> _ = zc.buildout.easy_install.scripts(
+    ...     [('safe', 'safe', 'main')], ws, sys.executable, bin,
+    ...     bundle='b.zip')
+    >>> print open(join(bin, 'safe')).read().split('sys.path[0:0] = ')[1],
+    ... # doctest: +ELLIPSIS
+    [
+      '/bin/b.zip',
+      '/eggs/unsafe-1.0-pyN.N.egg',
+      '/eggs/ext-1.0-pyN.N.egg',
+      '/eggs/plain-1.0-pyN.N.egg',
+      ]
+    ...
+    >>> print system(join(bin, 'safe')),
+    42
+
+When nothing can be bundled, no bundle is written:
+
+    >>> _ = zc.buildout.easy_install.scripts(
+    ...     [('safe', 'safe', 'main')], ws, sys.executable, bin,
+    ...     bundle='b.zip', extra_paths=[join(eggs, 'safe-1.0-py%s.egg'
+    ...                                       % sys.version[:3])])
+    >>> ls(bin)
+    -  safe
+    """
+
+def script_manifests():
+    """
+Digests of generated scripts can be recorded in a manifest:
+
+    >>> ws = pkg_resources.WorkingSet([])
+    >>> ws.add(create_egg_dir(tmpdir('eggs'), 'demo',
+    ...                       files={'demo.py': 'def main(): print 42\\n'}))
+
+    >>> bin = tmpdir('bin')
+    >>> def scripts():
+    ...     for path in zc.buildout.easy_install.scripts(
+    ...         [('demo', 'demo', 'main')], ws, sys.executable, bin,
+    ...         interpreter='py', manifest='.manifest'):
+    ...         print path
+    >>> scripts()
+    /bin/demo
+    /bin/py
+    /bin/.manifest
+    >>> print system(join(bin, 'demo')),
+    42
+
+Scripts whose size and modification time are those recorded aren't
+read, so a change that keeps them isn't noticed:
+
+    >>> os.utime(join(bin, 'demo'), (1000000000, 1000000000))
+    >>> scripts()
+    /bin/demo
+    /bin/py
+    /bin/.manifest
+    >>> contents = open(join(bin, 'demo')).read()
+    >>> write(bin, 'demo', contents.replace('main()', 'spam()'))
+    >>> os.utime(join(bin, 'demo'), (1000000000, 1000000000))
+    >>> scripts()
+    /bin/demo
+    /bin/py
+    /bin/.manifest
+    >>> 'spam' in open(join(bin, 'demo')).read()
+    True
+
+Other changes are, as is a missing or unreadable manifest:
+
+    >>> os.utime(join(bin, 'demo'), (1000000010, 1000000010))
+    >>> scripts()
+    /bin/demo
+    /bin/py
+    /bin/.manifest
+    >>> 'spam' in open(join(bin, 'demo')).read()
+    False
+
+    >>> write(bin, 'py', '')
+    >>> write(bin, '.manifest', 'garbage')
+    >>> scripts()
+    /bin/demo
+    /bin/py
+    /bin/.manifest
+    >>> print system(join(bin, 'py') + ' -c "import demo; demo.main()"'),
+    42
+    """
+
+def scripts_are_generated_by_a_pool_of_threads():
+    """
+Scripts are rendered and written by a pool of threads, but they are
+made executable and logged in order:
+
+    >>> import logging, zope.testing.loggingsupport
+    >>> handler = zope.testing.loggingsupport.InstalledHandler(
+    ...     'zc.buildout.easy_install', level=logging.INFO)
+    >>> dist = create_egg_dir(tmpdir('eggs'), 'demo', files={
+    ...     'EGG-INFO/entry_points.txt': '[console_scripts]\\n' +
+    ...         ''.join(['demo%d = demo:main\\n' % i for i in range(30)]),
+    ...     'demo.py': 'def main(): print 42\\n',
+    ...     })
+    >>> egg = dist.location
+    >>> ws = pkg_resources.WorkingSet([])
+    >>> ws.add(dist)
+
+    >>> bin = tmpdir('bin')
+    >>> generated = zc.buildout.easy_install.scripts(
+    ...     ['demo'], ws, sys.executable, bin)
+    >>> len(generated)
+    30
+    >>> [r.getMessage() for r in handler.records] == [
+    ...     'Generated script %r.' % path for path in generated]
+    True
+    >>> print system(generated[-1]),
+    42
+    >>> handler.uninstall()
+
+The console script entry points of installed eggs are read once:
+
+    >>> entry_map = zc.buildout.easy_install._entry_maps[
+    ...     (egg, 'demo')]
+    >>> len(entry_map)
+    30
+    >>> remove(egg, 'EGG-INFO', 'entry_points.txt')
+    >>> ws = pkg_resources.WorkingSet([])
+    >>> ws.add(list(pkg_resources.find_distributions(egg))[0])
+    >>> len(zc.buildout.easy_install.scripts(
+    ...     ['demo'], ws, sys.executable, bin))
+    30
+    >>> zc.buildout.easy_install._entry_maps.clear()
+    """
+
+def relative_paths_are_rendered_once_per_directory():
+    """
+With relative paths, the path of the scripts in a directory is
+rendered once:
+
+    >>> calls = []
+    >>> relativitize = zc.buildout.easy_install._relativitize
+    >>> def counting_relativitize(*args):
+    ...     calls.append(args)
+    ...     return relativitize(*args)
+    >>> zc.buildout.easy_install._relativitize = counting_relativitize
+
+    >>> eggs = tmpdir('eggs')
+    >>> ws = pkg_resources.WorkingSet([])
+    >>> for name in 'a', 'b', 'c':
+    ...     ws.add(create_egg_dir(eggs, name, files={
+    ...         name+'.py': 'def main(): print %r\\n' % name}))
+    >>> bin = tmpdir('bin')
+    >>> generated = zc.buildout.easy_install.scripts(
+    ...     [('a', 'a', 'main'), ('b', 'b', 'main'), ('c', 'c', 'main')],
+    ...     ws, sys.executable, bin, interpreter='py',
+    ...     relative_paths=os.path.dirname(bin))
+    >>> len(calls)
+    3
+    >>> zc.buildout.easy_install._relativitize = relativitize
+
+    >>> print system(join(bin, 'c')),
+    c
+    >>> cat(bin, 'b') # doctest: +ELLIPSIS
+    #!...
+    sys.path[0:0] = [
+      join(base, 'eggs/a-1.0-pyN.N.egg'),
+      join(base, 'eggs/b-1.0-pyN.N.egg'),
+      join(base, 'eggs/c-1.0-pyN.N.egg'),
+      ]
+    ...
+    """
+
+def offline_resolution_uses_an_index_of_the_eggs_directory():
+    """
+When an eggs index directory is set and nothing can be installed, as in
+offline mode, the eggs in an eggs directory are found using an index,
+kept in the eggs index directory:
+
+    >>> index = tmpdir('eggs-index')
+    >>> register_teardown(lambda old=zc.buildout.easy_install.eggs_index(index):
+    ...                   zc.buildout.easy_install.eggs_index(old))
+    >>> dest = tmpdir('sample-install')
+    >>> ws = zc.buildout.easy_install.install(
+    ...     ['demo==0.2'], dest, links=[link_server], index=link_server+'index/',
+    ...     always_unzip=True)
+    >>> ls(dest)
+    d  demo-0.2-py2.4.egg
+    d  demoneeded-1.1-py2.4.egg
+
+    >>> ws = zc.buildout.easy_install.working_set(
+    ...     ['demo'], sys.executable, [dest])
+    >>> [str(dist) for dist in ws]
+    ['demo 0.2', 'demoneeded 1.1']
+    >>> ls(dest)
+    d  demo-0.2-py2.4.egg
+    d  demoneeded-1.1-py2.4.egg
+    >>> import zc.buildout.eggindex
+    >>> os.listdir(index) == [
+    ...     os.path.basename(zc.buildout.eggindex.index_path(index, dest))]
+    True
+
+The requirements of the eggs come from the index, rather than the
+eggs, as long as the eggs haven't changed:
+
+    >>> read = []
+    >>> _read = zc.buildout.eggindex.Index._read
+    >>> def recording_read(self, name):
+    ...     read.append(name)
+    ...     return _read(self, name)
+    >>> zc.buildout.eggindex.Index._read = recording_read
+    >>> register_teardown(lambda: setattr(zc.buildout.eggindex.Index,
+    ...                                   '_read', _read))
+    >>> ws = zc.buildout.easy_install.working_set(
+    ...     ['demo'], sys.executable, [dest])
+    >>> [str(dist) for dist in ws]
+    ['demo 0.2', 'demoneeded 1.1']
+    >>> read
+    []
+
+Changes to the metadata of unzipped eggs are noticed, even though they
+don't change the modification time of the egg directory:
+
+    >>> egg = join(dest, 'demo-0.2-py%s.egg' % sys.version[:3])
+    >>> mtime = os.path.getmtime(egg)
+    >>> write(egg, 'EGG-INFO', 'requires.txt', '')
+    >>> os.utime(join(egg, 'EGG-INFO', 'requires.txt'),
+    ...          (mtime+10, mtime+10))
+    >>> os.path.getmtime(egg) == mtime
+    True
+    >>> ws = zc.buildout.easy_install.working_set(
+    ...     ['demo'], sys.executable, [dest])
+    >>> [str(dist) for dist in ws]
+    ['demo 0.2']
+    >>> read
+    ['demo-0.2-py2.4.egg']
+
+Eggs installed into the directory are added to the index:
+
+    >>> ws = zc.buildout.easy_install.install(
+    ...     ['demo==0.3'], dest, links=[link_server], index=link_server+'index/',
+    ...     always_unzip=True)
+    >>> entries = zc.buildout.eggindex.Index(index, dest).entries.keys()
+    >>> entries.sort()
+    >>> entries
+    ['demo-0.2-py2.4.egg', 'demo-0.3-py2.4.egg', 'demoneeded-1.1-py2.4.egg']
+
+and eggs removed are dropped from it:
+
+    >>> remove(dest, 'demo-0.3-py%s.egg' % sys.version[:3])
+    >>> ws = zc.buildout.easy_install.working_set(
+    ...     ['demo'], sys.executable, [dest])
+    >>> [str(dist) for dist in ws]
+    ['demo 0.2']
+    >>> entries = zc.buildout.eggindex.Index(index, dest).entries.keys()
+    >>> entries.sort()
+    >>> entries
+    ['demo-0.2-py2.4.egg', 'demoneeded-1.1-py2.4.egg']
+    """
+
+def custom_builds_are_reused_from_a_build_cache():
+    '''
+    When a build cache is set, eggs built from source distributions
+    are saved in it, keyed by the source distribution, the build_ext
+    options, any extra key data and the Python used:
+
+    >>> cache = tmpdir('build-cache')
+    >>> zc.buildout.easy_install.build_cache(cache)
+    >>> mkdir('include')
+    >>> write('include', 'extdemo.h',
+    ... """
+    ... #define EXTDEMO 42
+    ... """)
+    >>> build_ext = {'include-dirs': os.path.join(sample_buildout, 'include')}
+
+    >>> zc.buildout.easy_install.build(
+    ...   'extdemo', tmpdir('dest1'), build_ext,
+    ...   links=[link_server], index=link_server+'index/',
+    ...   newest=False)
+    ['/dest1/extdemo-1.4-py2.4-linux-i686.egg']
+
+    >>> [key] = os.listdir(cache)
+    >>> ls(cache, key)
+    d  extdemo-1.4-py2.4-linux-i686.egg
+
+    An identical build, here into another directory, uses the cached
+    eggs, so the build doesn't need the header file any more:
+
+    >>> remove('include', 'extdemo.h')
+    >>> [egg] = zc.buildout.easy_install.build(
+    ...   'extdemo', tmpdir('dest2'), build_ext,
+    ...   links=[link_server], index=link_server+'index/',
+    ...   newest=False)
+    >>> egg
+    '/dest2/extdemo-1.4-py2.4-linux-i686.egg'
+
+    >>> for name in sorted(os.listdir(egg)):
+    ...     if os.path.splitext(name)[1] not in ('.pyc', '.pyo'):
+    ...         print name
+    EGG-INFO
+    extdemo.py
+    extdemo.so
+
+    Builds with other key data aren't taken from the cache:
+
+    >>> zc.buildout.easy_install.build(
+    ...   'extdemo', tmpdir('dest3'), build_ext,
+    ...   links=[link_server], index=link_server+'index/',
+    ...   newest=False, key_data='other') # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    UserError: Couldn't install: extdemo 1.4
+
+    >>> zc.buildout.easy_install.build_cache(None)
+    '/build-cache'
+    '''
+
+def extension_sources_are_compiled_by_a_number_of_threads():
+    """
+    Builds run setup scripts with a number of compile jobs, given by
+    the build-jobs build_ext option and defaulting to the number of
+    CPUs.  The setup scripts are run after code that makes the
+    compilers compile sources using that many threads:
+
+    >>> import distutils.ccompiler, threading, time
+    >>> register_teardown(
+    ...     lambda original=distutils.ccompiler.CCompiler.compile:
+    ...     setattr(distutils.ccompiler.CCompiler, 'compile', original))
+    >>> exec zc.buildout.easy_install._compile_jobs_source % dict(jobs=2)
+
+    >>> class Compiler(distutils.ccompiler.CCompiler):
+    ...     src_extensions = ['.c']
+    ...     obj_extension = '.o'
+    ...     executables = {}
+    ...     threads = set()
+    ...     def _compile(self, obj, src, ext, cc_args, extra_postargs,
+    ...                  pp_opts):
+    ...         if src == 'bad.c':
+    ...             raise distutils.ccompiler.CompileError(src)
+    ...         self.threads.add(threading.currentThread())
+    ...         time.sleep(0.1)
+
+    >>> objects = tmpdir('objects')
+    >>> Compiler().compile(['a.c', 'b.c', 'c.c', 'd.c'], objects)
+    ... # doctest: +NORMALIZE_WHITESPACE
+    ['/objects/a.o', '/objects/b.o', '/objects/c.o', '/objects/d.o']
+    >>> len(Compiler.threads)
+    2
+
+    Errors are raised once the threads are done:
+
+    >>> Compiler().compile(['a.c', 'bad.c'], objects)
+    Traceback (most recent call last):
+    ...
+    CompileError: bad.c
+
+    The build-jobs option isn't a build_ext option, so it isn't
+    written to setup.cfg:
+
+    >>> zc.buildout.easy_install._build_jobs({'build-jobs': 4, 'debug': '1'})
+    ({'debug': '1'}, 4)
+    >>> build_ext, jobs = zc.buildout.easy_install._build_jobs({})
+    >>> jobs == zc.buildout.pool.cpu_count()
+    True
+    """
+
+def recipes_can_find_the_parts_being_installed_and_section_references():
+    """
+Recipes can ask a buildout which parts it is installing, or updating,
+in order, and which sections the options of a section refer to:
+
+    >>> create_recipe('recipe',
+    ... '''
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         self.buildout, self.name = buildout, name
+    ...         options.get('x')
+    ...     def install(self):
+    ...         print self.name, self.buildout.parts_to_install(),
+    ...         print self.buildout.references(self.name)
+    ...         return ()
+    ...     update = install
+    ... ''')
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a c
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... x = ${b:y} ${:z}
+    ... z = ${settings:z}
+    ...
+    ... [b]
+    ... recipe = recipe
+    ... y = ${buildout:directory}
+    ...
+    ... [c]
+    ... recipe = recipe
+    ...
+    ... [settings]
+    ... z = 1
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing b.
+    b ['b', 'a', 'c'] ['buildout']
+    Installing a.
+    a ['b', 'a', 'c'] ['a', 'b', 'settings']
+    Installing c.
+    c ['b', 'a', 'c'] []
+
+    >>> print system(buildout+' install c'),
+    Develop: '/sample-buildout/recipe'
+    Updating c.
+    c ['c'] []
+    """
+
+def benchmark_harness():
+    """
+The benchmark module serves a synthetic index, in which project i
+requires the following projects:
+
+    >>> import zc.buildout.benchmark
+    >>> bench = tmpdir('bench')
+    >>> index = zc.buildout.benchmark.create_index(
+    ...     bench, projects=3, versions=2, requires=1)
+    >>> ls(bench, index, 'bench1')
+    -  bench1-1.0-pyN.N.egg
+    -  bench1-1.1-pyN.N.egg
+
+The server counts the requests made while resolving:
+
+    >>> url, server = zc.buildout.benchmark.start_server(bench, latency=0.01)
+    >>> eggs = tmpdir('bench-eggs')
+    >>> stats = zc.buildout.benchmark.resolve(
+    ...     url+index+'/', 'bench0', eggs, server)
+    >>> stats['distributions'], stats['requests']
+    (3, 6)
+    >>> ls(eggs)
+    -  bench0-1.1-pyN.N.egg
+    -  bench1-1.1-pyN.N.egg
+    -  bench2-1.1-pyN.N.egg
+
+    >>> stats = zc.buildout.benchmark.download(
+    ...     [url+index+'/bench2/bench2-1.0-py%s.egg'
+    ...      % zc.buildout.benchmark.pyversion], server)
+    >>> stats['downloads'], stats['requests'], stats['bytes'] == stats['size']
+    (1, 1, True)
+
+Errors can be injected:
+
+    >>> server.error_rate = 1
+    >>> zc.buildout.benchmark.resolve(
+    ...     url+index+'/', 'bench0', tmpdir('bench-eggs2'), server)
+    Traceback (most recent call last):
+    ...
+    MissingDistribution: Couldn't find a distribution for 'bench0'.
+    >>> server.errors
+    1
+
+    >>> zc.buildout.benchmark.stop_server(url, server)
+    """
+
+def benchmark_startup():
+    """
+The startup benchmark creates a set of eggs, and a startmain egg whose
+module imports modules spread over them:
+
+    >>> import zc.buildout.benchmark
+    >>> bench = tmpdir('bench')
+    >>> ws = zc.buildout.benchmark.create_eggs(bench, eggs=6, imports=3)
+    >>> [dist.project_name for dist in ws]
+    ['bench0', 'bench1', 'bench2', 'bench3', 'bench4', 'bench5', 'startmain']
+    >>> cat(ws.find(pkg_resources.Requirement.parse('startmain')).location,
+    ...     'startmain.py')
+    import bench1
+    import bench3
+    import bench5
+    def main():
+        pass
+
+and times scripts generated with and without an import map:
+
+    >>> results = zc.buildout.benchmark.run_startup(eggs=6, repeat=2)
+    >>> [(name, stats['failures']) for (name, stats) in results]
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [('startup', 0), ('startup', 0),
+     ('startup-import-map', 0), ('startup-import-map', 0)]
+    """
+
+def test_server_keep_alive_ranges_and_etags():
+    """
+The test server is threaded and speaks HTTP/1.1, so a connection can
+be reused for several requests:
+
+    >>> import httplib
+    >>> server = tmpdir('server')
+    >>> write(server, 'data.txt', '0123456789')
+    >>> url = start_server(server)
+    >>> port = int(url.split(':')[-1][:-1])
+    >>> conn = httplib.HTTPConnection('localhost', port)
+    >>> conn.request('GET', '/data.txt')
+    >>> response = conn.getresponse()
+    >>> response.status, response.read()
+    (200, '0123456789')
+    >>> etag = response.getheader('ETag')
+
+Range requests are supported:
+
+    >>> conn.request('GET', '/data.txt', headers={'Range': 'bytes=2-4'})
+    >>> response = conn.getresponse()
+    >>> response.status, response.getheader('Content-Range'), response.read()
+    (206, 'bytes 2-4/10', '234')
+
+    >>> conn.request('GET', '/data.txt', headers={'Range': 'bytes=-3'})
+    >>> response = conn.getresponse()
+    >>> response.status, response.read()
+    (206, '789')
+
+    >>> conn.request('GET', '/data.txt', headers={'Range': 'bytes=20-'})
+    >>> response = conn.getresponse()
+    >>> response.status, response.getheader('Content-Range'), response.read()
+    (416, 'bytes */10', '')
+
+as are conditional requests:
+
+    >>> conn.request('GET', '/data.txt', headers={'If-None-Match': etag})
+    >>> response = conn.getresponse()
+    >>> response.status, response.read()
+    (304, '')
+    >>> conn.close()
+
+The server keeps counts of the connections it accepted, the requests
+it handled and the bytes it served.  Control requests, like the ones
+for the counts themselves, aren't counted:
+
+    >>> print get(url+'__stats__'),
+    connections: 1
+    requests: 5
+    bytes: 16
+
+    >>> print get(url+'data.txt')
+    0123456789
+    >>> print get(url+'__stats__'),
+    connections: 2
+    requests: 6
+    bytes: 26
+    """
+
 ######################################################################
 
 def create_sample_eggs(test, executable=sys.executable):
@@ -2825,6 +4236,8 @@ def test_suite():
                zc.buildout.testing.normalize_egg_py,
                (re.compile('__buildout_signature__ = recipes-\S+'),
                 '__buildout_signature__ = recipes-SSSSSSSSSSS'),
+               (re.compile('__buildout_digest__ = \S+'),
+                '__buildout_digest__ = DDDDDDDDDDD'),
                (re.compile('[-d]  setuptools-\S+[.]egg'), 'setuptools.egg'),
                (re.compile('zc.buildout(-\S+)?[.]egg(-link)?'),
                 'zc.buildout.egg'),
@@ -2950,6 +4363,8 @@ def test_suite():
                zc.buildout.testing.normalize_egg_py,
                (re.compile('__buildout_signature__ = recipes-\S+'),
                 '__buildout_signature__ = recipes-SSSSSSSSSSS'),
+               (re.compile('__buildout_digest__ = \S+'),
+                '__buildout_digest__ = DDDDDDDDDDD'),
                (re.compile('[-d]  setuptools-\S+[.]egg'), 'setuptools.egg'),
                (re.compile('zc.buildout(-\S+)?[.]egg(-link)?'),
                 'zc.buildout.egg'),
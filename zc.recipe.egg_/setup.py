@@ -45,6 +45,8 @@ setup(
         + '\n' +
         read('src', 'zc', 'recipe', 'egg', 'api.txt')
         + '\n' +
+        read('src', 'zc', 'recipe', 'egg', 'dependencies.txt')
+        + '\n' +
         'Download\n'
         '*********\n'
         ),
@@ -64,7 +66,7 @@ setup(
     package_dir = {'':'src'},
     namespace_packages = ['zc', 'zc.recipe'],
     install_requires = [
-        'zc.buildout >=1.2.0',
+        'zc.buildout >=1.4.5dev',
         'setuptools'],
     tests_require = ['zope.testing'],
     test_suite = name+'.tests.test_suite',
@@ -18,9 +18,12 @@ $Id$
 
 import logging
 import os
+import pkg_resources
 import re
 import sys
+import zc.buildout
 import zc.buildout.easy_install
+import zc.buildout.pool
 import zipfile
 
 logger = logging.getLogger(__name__)
@@ -43,6 +46,7 @@ class Custom(Base):
 
     def __init__(self, buildout, name, options):
         Base.__init__(self, buildout, name, options)
+        self.buildout = buildout
 
         links = options.get('find-links',
                             buildout['buildout'].get('find-links'))
@@ -75,8 +79,19 @@ class Custom(Base):
             self.install = lambda: ()
 
         self.newest = buildout['buildout'].get('newest') == 'true'
+        self._built = None
 
     def install(self):
+        if self._built is None:
+            self._build_concurrently()
+        built, self._built = self._built, None
+        result, exc_info = built
+        if exc_info is not None:
+            t, v, tb = exc_info
+            raise t, v, tb
+        return result
+
+    def _build(self, jobs=None):
         options = self.options
         distribution = options.get('egg')
         if distribution is None:
@@ -89,16 +104,85 @@ class Custom(Base):
 
         distribution = options.get('egg', options.get('eggs', self.name)
                                    ).strip()
+        build_ext = self.build_ext
+        if jobs is not None and 'build-jobs' not in build_ext:
+            build_ext = dict(build_ext)
+            build_ext['build-jobs'] = jobs
         self._set_environment()
         try:
             return zc.buildout.easy_install.build(
-                distribution, options['_d'], self.build_ext,
+                distribution, options['_d'], build_ext,
                 self.links, self.index, sys.executable,
                 [options['_e']], newest=self.newest,
+                key_data=options['_environment-data'],
                 )
         finally:
             self._restore_environment()
 
+    def _build_concurrently(self):
+        # Build this part along with the custom parts installed right
+        # after it, as long as their options don't reference other
+        # parts, or get referenced by them.  Each part gets the result
+        # of its build when it is installed.
+        batch = [self]
+        if self._independent():
+            parts = self.buildout.parts_to_install()
+            for name in parts[parts.index(self.name)+1:]:
+                recipe = getattr(self.buildout[name], 'recipe', None)
+                if not (isinstance(recipe, Custom) and recipe._built is None
+                        and recipe._independent()):
+                    break
+                batch.append(recipe)
+
+        # Parts building the same project would install it over each
+        # other.
+        seen = {}
+        batch = [recipe for recipe in batch
+                 if seen.setdefault(recipe._project(), recipe) is recipe]
+
+        cpus = zc.buildout.pool.cpu_count()
+        jobs = None
+        if len(batch) > 1:
+            logging.getLogger(self.name).info(
+                "Building concurrently with %s.",
+                ', '.join([recipe.name for recipe in batch[1:]]))
+            # The parts share the CPUs, rather than each compiling
+            # with as many jobs as there are CPUs.
+            jobs = max(1, cpus / len(batch))
+
+        def build(recipe):
+            try:
+                recipe._built = recipe._build(jobs), None
+            except:
+                recipe._built = None, sys.exc_info()
+
+        zc.buildout.pool.map(build, batch, cpus)
+
+    def _independent(self):
+        # Parts with environment settings change os.environ while
+        # building, so they're always built on their own.
+        if self.environment:
+            return False
+        buildout = self.buildout
+        if self.name not in buildout.parts_to_install():
+            return False # not run by a buildout
+        for section in buildout.references(self.name):
+            if section != self.name and 'recipe' in buildout[section]:
+                return False
+        for section in buildout:
+            if (section != self.name
+                and self.name in buildout.references(section)):
+                return False
+        return True
+
+    def _project(self):
+        distribution = self.options.get(
+            'egg', self.options.get('eggs', self.name))
+        try:
+            return pkg_resources.Requirement.parse(distribution).key
+        except ValueError:
+            return distribution
+
 
     def _set_environment(self):
         self._saved_environment = {}
@@ -158,6 +242,16 @@ def build_ext(buildout, options):
             swig,
             )
 
+    jobs = options.get('build-jobs')
+    if jobs is not None:
+        try:
+            if int(jobs) < 1:
+                raise ValueError(jobs)
+        except ValueError:
+            raise zc.buildout.UserError(
+                "Invalid value for build-jobs option: %s" % jobs)
+        result['build-jobs'] = int(jobs)
+
     for be_option in ('define', 'undef', 'libraries', 'link-objects',
                       'debug', 'force', 'compiler', 'swig-cpp', 'swig-opts',
                       ):
@@ -16,11 +16,18 @@
 
 import logging
 import os
+import pkg_resources
 import re
 import sys
 import zc.buildout.easy_install
 import zipfile
 
+try:
+    from hashlib import md5
+except ImportError:
+    # Python 2.4 and older
+    from md5 import md5
+
 class Eggs(object):
 
     def __init__(self, buildout, name, options):
@@ -54,6 +61,13 @@ class Eggs(object):
 
         assert options.get('unzip') in ('true', 'false', None)
 
+        self.graph = None
+        if get_bool(options, 'dependency-graph',
+                    get_bool(buildout['buildout'], 'dependency-graph')):
+            self.graph = os.path.join(
+                buildout['buildout']['parts-directory'],
+                name + '.dependencies')
+
     def working_set(self, extra=()):
         """Separate method to just get the working set
 
@@ -71,7 +85,18 @@ class Eggs(object):
         orig_distributions = distributions[:]
         distributions.extend(extra)
 
-        if self.buildout['buildout'].get('offline') == 'true':
+        offline = self.buildout['buildout'].get('offline') == 'true'
+        newest = self.buildout['buildout'].get('newest') == 'true'
+        if self.graph:
+            key = self._graph_key(distributions)
+            if offline or not newest:
+                ws = load_graph(self.graph, key, distributions)
+                if ws is not None:
+                    logging.getLogger(self.name).debug(
+                        "Using the dependency graph in %s.", self.graph)
+                    return orig_distributions, ws
+
+        if offline:
             ws = zc.buildout.easy_install.working_set(
                 distributions,
                 [options['develop-eggs-directory'], options['eggs-directory']]
@@ -86,14 +111,47 @@ class Eggs(object):
                 links=self.links,
                 index=self.index,
                 path=[options['develop-eggs-directory']],
-                newest=self.buildout['buildout'].get('newest') == 'true',
+                newest=newest,
                 allow_hosts=self.allow_hosts,
                 **kw)
 
+        if self.graph:
+            save_graph(self.graph, key, distributions, ws)
+
         return orig_distributions, ws
 
+    def _graph_key(self, distributions):
+        # The dependency graph is valid for as long as the requirements,
+        # the settings used to resolve them and the develop eggs are
+        # the same.  Develop eggs are rebuilt on every run, so they are
+        # compared by content.
+        options = self.options
+        develop = options['develop-eggs-directory']
+        develop_eggs = []
+        if os.path.isdir(develop):
+            for name in os.listdir(develop):
+                path = os.path.join(develop, name)
+                if os.path.isfile(path):
+                    develop_eggs.append((name, open(path).read()))
+                else:
+                    develop_eggs.append((name, os.path.getmtime(path)))
+        develop_eggs.sort()
+        versions = zc.buildout.easy_install.default_versions().items()
+        versions.sort()
+        return md5(repr((
+            distributions, options['eggs-directory'], develop_eggs,
+            self.links, self.index, self.allow_hosts, options.get('unzip'),
+            versions,
+            zc.buildout.easy_install.prefer_final(),
+            zc.buildout.easy_install.use_dependency_links(),
+            zc.buildout.easy_install.always_unzip(),
+            sys.executable,
+            ))).hexdigest()
+
     def install(self):
         reqs, ws = self.working_set()
+        if self.graph:
+            return (self.graph, )
         return ()
 
     update = install
@@ -126,6 +184,25 @@ class Scripts(Eggs):
             self._relative_paths = ''
             assert relative_paths == 'false'
 
+        self._import_map = get_bool(
+            options, 'import-map',
+            get_bool(buildout['buildout'], 'import-map'))
+
+        self._path_module = None
+        if get_bool(options, 'path-module',
+                    get_bool(buildout['buildout'], 'path-module')):
+            self._path_module = name + '-paths'
+
+        self._bundle = None
+        if get_bool(options, 'bundle',
+                    get_bool(buildout['buildout'], 'bundle')):
+            self._bundle = name + '.zip'
+
+        self._manifest = None
+        if get_bool(options, 'manifest',
+                    get_bool(buildout['buildout'], 'manifest')):
+            self._manifest = '.%s.manifest' % name
+
     parse_entry_point = re.compile(
         '([^=]+)=(\w+(?:[.]\w+)*):(\w+(?:[.]\w+)*)$'
         ).match
@@ -159,7 +236,7 @@ class Scripts(Eggs):
                     if name != 'setuptools' and name not in reqs:
                         reqs.append(name)
 
-            return zc.buildout.easy_install.scripts(
+            installed = zc.buildout.easy_install.scripts(
                 reqs, ws, sys.executable, options['bin-directory'],
                 scripts=scripts,
                 extra_paths=self.extra_paths,
@@ -167,12 +244,111 @@ class Scripts(Eggs):
                 initialization=options.get('initialization', ''),
                 arguments=options.get('arguments', ''),
                 relative_paths=self._relative_paths,
+                import_map=self._import_map,
+                path_module=self._path_module,
+                bundle=self._bundle,
+                manifest=self._manifest,
                 )
+        else:
+            installed = []
 
-        return ()
+        if self.graph:
+            installed.append(self.graph)
+        return installed
 
     update = install
 
+def dependency_graph(distributions, ws):
+    """Return the dependency graph of a working set
+
+    The graph is a list of (requirer, requirement, project name,
+    version, location) tuples, for the requirements in distributions
+    and those of the distributions they select, with extras, in the
+    order they are resolved.  The requirer of the requirements in
+    distributions is None.
+    """
+    graph = []
+    seen = {}
+    todo = [(None, pkg_resources.Requirement.parse(r)) for r in distributions]
+    while todo:
+        requirer, req = todo.pop(0)
+        dist = ws.find(req)
+        if dist is None:
+            continue # not installable here, like setuptools on jython
+        graph.append((requirer, str(req), dist.project_name,
+                      dist.version, dist.location))
+        key = dist.project_name.lower()
+        if key in seen:
+            extras = [e for e in req.extras if e not in seen[key]]
+            if not extras:
+                continue
+            requires = [r for r in dist.requires(extras)
+                        if r not in dist.requires()]
+        else:
+            seen[key] = []
+            extras = req.extras
+            requires = dist.requires(extras)
+        seen[key].extend(extras)
+        for r in requires:
+            todo.append((dist.project_name, r))
+    return graph
+
+def save_graph(path, key, distributions, ws):
+    """Write the dependency graph of a working set to path
+
+    Each line is either the key, identifying the settings the graph
+    was computed with, or an edge, with the requirer ("-" for the part
+    itself), the requirement, and the project name, version and
+    location of the distribution selected.  The file is only written
+    if it changes.
+    """
+    lines = ['key %s' % key]
+    for requirer, req, project, version, location in dependency_graph(
+        distributions, ws):
+        lines.append('%s %s %s %s %s' % (requirer or '-', req, project,
+                                         version, location))
+    contents = '\n'.join(lines) + '\n'
+    if os.path.exists(path) and open(path).read() == contents:
+        return
+    parent = os.path.dirname(path)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    open(path, 'w').write(contents)
+
+def load_graph(path, key, distributions):
+    """Return a working set from the dependency graph in path
+
+    None is returned if there is no graph for key, or if any of the
+    distributions it lists is missing or no longer satisfies the
+    requirements.
+    """
+    try:
+        lines = open(path).read().split('\n')
+    except IOError:
+        return None
+    if not lines or lines[0] != 'key %s' % key:
+        return None
+    ws = pkg_resources.WorkingSet([])
+    try:
+        for line in lines[1:]:
+            if not line:
+                continue
+            requirer, req, project, version, location = line.split(' ', 4)
+            if ws.find(pkg_resources.Requirement.parse(project)) is not None:
+                continue
+            for dist in pkg_resources.find_distributions(location, True):
+                if (dist.project_name == project
+                    and dist.version == version):
+                    ws.add(dist)
+                    break
+            else:
+                return None
+        ws.resolve([pkg_resources.Requirement.parse(r)
+                    for r in distributions])
+    except (ValueError, pkg_resources.ResolutionError):
+        return None
+    return ws
+
 def get_bool(options, name, default=False):
     value = options.get(name)
     if not value:
@@ -63,12 +63,26 @@ def test_suite():
                            'zc.buildout-\S+\s*'
                            ),
                 '__buildout_signature__ = sample- zc.recipe.egg-'),
+               (re.compile('__buildout_digest__ = \S+'),
+                '__buildout_digest__ = DDDDDDDDDDD'),
                (re.compile('find-links = http://localhost:\d+/'),
                 'find-links = http://localhost:8080/'),
                (re.compile('index = http://localhost:\d+/index'),
                 'index = http://localhost:8080/index'),
                ])
             ),
+        doctest.DocFileSuite(
+            'dependencies.txt',
+            setUp=setUp, tearDown=zc.buildout.testing.buildoutTearDown,
+            checker=renormalizing.RENormalizing([
+               zc.buildout.testing.normalize_path,
+               zc.buildout.testing.normalize_endings,
+               zc.buildout.testing.normalize_egg_py,
+               (re.compile('warning: \\w+: byte-compiling is disabled, '
+                           'skipping.\n+'), ''),
+               ]),
+            optionflags=doctest.ELLIPSIS,
+            ),
         doctest.DocFileSuite(
             'custom.txt',
             setUp=setUp, tearDown=zc.buildout.testing.buildoutTearDown,